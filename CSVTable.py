@@ -1,19 +1,46 @@
 # -*- coding: utf-8 -*-
 """ Script by Toybich Egor
 """
-__version__ = '1.0.1'
+__version__ = '1.4.0'
 
+import os
 import csv
+import hashlib
+from array import array
 from glob import glob 
 
-def read_to_list(filename, csv_delim=','):
+try: import cPickle as pickle
+except ImportError: import pickle
+
+try: import mmap
+except ImportError: mmap = None
+
+try: intern
+except NameError: from sys import intern
+
+CACHE_DIR = '_CSVCache'			#: cache directory created next to csv file if cache=True
+CACHE_LIMIT = 256 * 1024**2		#: total size of cache directory in bytes, least recently used files go first
+INDEX_EXT = '.idx'				#: extension of row index file written next to csv file
+
+def read_to_list(filename, csv_delim=',', cache=None):
+	"""Reads csv file into a list of rows
 	
+	Args:
+		filename: str; file name or search pattern
+		csv_delim: str; csv delimiter
+		cache: bool or str; keep parsed file in a cache directory (True for CACHE_DIR
+			next to the file); cache is reused while file path, size and mtime are the same
+	"""
 	try:
 		file_list = [f for f in glob(filename)]
 		file_found = file_list[0]
 	except:
 		print('File not found!')
 		raise
+	
+	cache_file = _cache_file(file_found, cache, ('list', csv_delim))
+	res = _cache_load(cache_file)
+	if res is not None: return res
 		
 	try:
 		res = []
@@ -21,6 +48,7 @@ def read_to_list(filename, csv_delim=','):
 			spamreader = csv.reader(decomment(csvfile), delimiter=csv_delim)
 			for i, row in enumerate(spamreader):
 				res.append(row)
+		_cache_save(cache_file, res)
 		return res
 	except Exception as err_msg:
 		print('An error occured wile reading CSV file!')
@@ -28,10 +56,260 @@ def read_to_list(filename, csv_delim=','):
 		raise
 	
 
-def read_to_dict(filename, key_column=1, csv_delim=','):
+def iter_rows(filename, types=None, csv_delim=',', batch=0):
+	"""Reads csv file row by row without loading it into memory
+	
+	Args:
+		filename: str; file name or search pattern
+		types: list or dict; column types, e.g. [str, float, int] or {2: float} 
+			with 1-based column numbers (same as key_column); other columns stay str
+		csv_delim: str; csv delimiter
+		batch: int; if > 0, yield lists of this many rows instead of single rows
+	"""
+	try:
+		file_list = [f for f in glob(filename)]
+		file_found = file_list[0]
+	except:
+		print('File not found!')
+		raise
+	
+	convert = _converters(types)
+	with open(file_found, 'r') as csvfile:
+		spamreader = csv.reader(decomment(csvfile), delimiter=csv_delim)
+		if batch > 0:
+			rows = []
+			for row in spamreader:
+				rows.append(_convert_row(row, convert))
+				if len(rows) == batch:
+					yield rows
+					rows = []
+			if rows: yield rows
+		else:
+			for row in spamreader:
+				yield _convert_row(row, convert)
+	
+def read_to_table(filename, names=None, csv_delim=',', types=None, cache=None, rows=None):
+	"""Reads csv file into a columnar Table
+	
+	Columns where every value is a number are stored as array('d'),
+	other columns are stored as lists of interned strings.
+	
+	Args:
+		filename: str; file name or search pattern
+		names: list; column names, only this many columns are read; 
+			defaults to column numbers starting from 1
+		csv_delim: str; csv delimiter
+		types: list or dict; column types as in iter_rows(), only str matters here:
+			such columns are kept as text even if they look like numbers
+		cache: bool or str; see read_to_list()
+		rows: tuple; (start, stop) range of data rows to read using row index, see read_rows()
+	"""
+	try:
+		file_found = glob(filename)[0]
+	except:
+		print('File not found!')
+		raise
+	
+	cache_file = _cache_file(file_found, cache, ('table', csv_delim, names, types, rows))
+	table = _cache_load(cache_file)
+	if table is not None: return table
+	
+	if isinstance(types, dict): 
+		types = [(int(k) - 1, t) for k, t in types.items()]
+	elif types: 
+		types = list(enumerate(types))
+	text_columns = [i for i, t in (types or []) if t in (str, 'str')]
+	if rows is None:
+		batches = iter_rows(file_found, csv_delim=csv_delim, batch=4096)
+	else:
+		batches = [read_rows(file_found, rows[0], rows[1], csv_delim=csv_delim)]
+	
+	table = None
+	for batch in batches:
+		if not batch: continue
+		if table is None:
+			width = len(batch[0]) if names is None else len(names)
+			table = Table(names if names is not None else range(1, width + 1))
+			for i in text_columns:
+				if i < width: table._to_str(i)
+		table.extend(batch)
+	if table is None: table = Table(names or [])
+	_cache_save(cache_file, table)
+	return table
+	
+def build_index(filename):
+	"""Writes byte offsets of data rows (comments skipped) to filename + INDEX_EXT
+	
+	Index is rebuilt automatically by read_rows() when csv file changes.
+	Returns index as array of offsets.
+	
+	Args:
+		filename: str; csv file
+	"""
+	offsets = _offset_array()
+	pos = 0
+	with open(filename, 'rb') as csvfile:
+		for line in csvfile:
+			if line.split(b'#')[0].strip(): offsets.append(pos)
+			pos += len(line)
+	
+	stat = os.stat(filename)
+	temp_file = '{}{}.{}.tmp'.format(filename, INDEX_EXT, os.getpid())
+	with open(temp_file, 'wb') as f:
+		header = 'CSVIDX {} {!r} {} {}\n'.format(stat.st_size, stat.st_mtime, offsets.typecode, len(offsets))
+		f.write(header.encode('ascii'))
+		offsets.tofile(f)
+	if os.path.exists(filename + INDEX_EXT): os.remove(filename + INDEX_EXT)
+	os.rename(temp_file, filename + INDEX_EXT)
+	return offsets
+	
+def load_index(filename):
+	"""Reads row index of a csv file, builds it if it's missing or outdated
+	
+	Args:
+		filename: str; csv file
+	"""
+	stat = os.stat(filename)
+	try:
+		with open(filename + INDEX_EXT, 'rb') as f:
+			tag, size, mtime, typecode, count = f.readline().decode('ascii').split()
+			if tag != 'CSVIDX' or int(size) != stat.st_size or float(mtime) != stat.st_mtime:
+				raise ValueError('Index is outdated')
+			offsets = array(typecode)
+			offsets.fromfile(f, int(count))
+			return offsets
+	except (IOError, OSError, ValueError, EOFError):
+		return build_index(filename)
+		
+def read_rows(filename, start, stop=None, csv_delim=',', types=None):
+	"""Reads data rows [start, stop) of a csv file without parsing the rest of it
+	
+	Rows are counted from 0 and comments are not counted. Uses the row index
+	(see build_index) and mmap to read only the needed part of a file.
+	Result can be passed to WBInterface.input_by_DPs().
+	
+	Args:
+		filename: str; file name or search pattern
+		start: int; first row
+		stop: int; row after the last one, defaults to the end of file
+		csv_delim: str; csv delimiter
+		types: list or dict; column types, see iter_rows()
+	"""
+	try:
+		file_found = glob(filename)[0]
+	except:
+		print('File not found!')
+		raise
+	
+	offsets = load_index(file_found)
+	start, stop, _ = slice(start, stop).indices(len(offsets))
+	if start >= stop: return []
+	
+	begin = int(offsets[start])
+	with open(file_found, 'rb') as csvfile:
+		end = int(offsets[stop]) if stop < len(offsets) else os.fstat(csvfile.fileno()).st_size
+		if mmap is not None:
+			mm = mmap.mmap(csvfile.fileno(), 0, access=mmap.ACCESS_READ)
+			try: chunk = mm[begin:end]
+			finally: mm.close()
+		else:
+			csvfile.seek(begin)
+			chunk = csvfile.read(end - begin)
+	
+	if not isinstance(chunk, str): chunk = chunk.decode('utf-8')
+	lines = chunk.splitlines()
+	convert = _converters(types)
+	return [_convert_row(row, convert) for row in csv.reader(decomment(lines), delimiter=csv_delim)]
+	
+def read_to_dict(filename, key_column=1, csv_delim=',', cache=None):
 	cd = csv_delim
-	return list2dict(read_to_list(filename, csv_delim=cd), key_column-1)
+	return list2dict(read_to_list(filename, csv_delim=cd, cache=cache), key_column-1)
+	
+class Table(object):
+	"""Compact columnar table
 	
+	Numeric columns are array('d'), text columns are lists of interned str.
+	Columns are accessed by name: table['p1'], rows by iterating.
+	
+	Args:
+		names: list; column names
+	"""
+	def __init__(self, names):
+		self._names = list(names)
+		self._index = dict((name, i) for i, name in enumerate(self._names))
+		self._columns = [array('d') for _ in self._names]
+		self._rows = 0
+		
+	@property
+	def names(self):
+		"""Column names"""
+		return list(self._names)
+		
+	@property
+	def columns(self):
+		"""List of columns"""
+		return list(self._columns)
+		
+	def __len__(self):
+		return self._rows
+		
+	def __getitem__(self, name):
+		return self._columns[self._index[name]]
+		
+	def __iter__(self):
+		for i in range(self._rows):
+			yield [col[i] for col in self._columns]
+			
+	def __repr__(self):
+		return 'Table: {} row(s) x {} column(s)'.format(self._rows, len(self._names))
+			
+	def items(self):
+		"""(name, column) pairs"""
+		return list(zip(self._names, self._columns))
+		
+	def append(self, row):
+		"""Appends a row of str or numbers"""
+		if len(row) < len(self._columns):
+			raise ValueError('Row {} is too short: {} value(s) instead of {}'.format(
+				self._rows + 1, len(row), len(self._columns)))
+		for i, col in enumerate(self._columns):
+			value = row[i]
+			if isinstance(col, array):
+				try: 
+					col.append(float(value))
+					continue
+				except ValueError:
+					col = self._to_str(i)
+			col.append(intern(str(value).strip()))
+		self._rows += 1
+		
+	def extend(self, rows):
+		"""Appends many rows, converts whole columns at once"""
+		width = len(self._columns)
+		for n, row in enumerate(rows):
+			if len(row) < width:
+				raise ValueError('Row {} is too short: {} value(s) instead of {}'.format(
+					self._rows + n + 1, len(row), width))
+		for i, values in enumerate(list(zip(*rows))[:width] if width else []):
+			col = self._columns[i]
+			if isinstance(col, array):
+				try:
+					col.extend(array('d', map(float, values)))
+					continue
+				except ValueError:
+					col = self._to_str(i)
+			col.extend(intern(str(v).strip()) for v in values)
+		self._rows += len(rows)
+		
+	def to_list(self):
+		"""Row-wise list of lists"""
+		return list(self)
+		
+	def _to_str(self, i):
+		"""Turns numeric column into str column"""
+		self._columns[i] = [intern(_num_str(v)) for v in self._columns[i]]
+		return self._columns[i]
+		
 def list2dict(lrange, key_el=0):
 	"""Converts list to a dictionary with some column as keys
 	"""
@@ -57,4 +335,132 @@ def decomment(csvfile):
 	"""Remove comments from file."""
 	for row in csvfile:
 		raw = row.split('#')[0].strip()
-		if raw: yield raw
\ No newline at end of file
+		if raw: yield raw
+		
+def _converters(types):
+	"""Makes {column index: function} from types argument"""
+	if not types: return {}
+	names = {'float': float, 'int': _to_int, 'str': None}
+	if isinstance(types, dict): 
+		items = [(int(k) - 1, t) for k, t in types.items()]
+	else: 
+		items = list(enumerate(types))
+	convert = {}
+	for i, t in items:
+		t = names.get(t, t) if isinstance(t, str) else t
+		if t is int: t = _to_int
+		if t is not None and t is not str: convert[i] = t
+	return convert
+	
+def _convert_row(row, convert):
+	"""Converts declared columns of a row"""
+	for i, fun in convert.items():
+		if i < len(row): row[i] = fun(row[i].strip())
+	return row
+	
+def _offset_array():
+	"""Empty array of 64-bit offsets"""
+	for typecode in ('Q', 'L'):
+		try: 
+			if array(typecode).itemsize == 8: return array(typecode)
+		except ValueError: 
+			pass
+	return array('d')
+	
+def _to_int(value):
+	"""int() that also accepts '1.0' and '1e3'"""
+	try: return int(value)
+	except ValueError: return int(float(value))
+	
+def _num_str(value):
+	"""Prints float without '.0' if it is integer"""
+	if value.is_integer() and abs(value) < 1e15: return str(int(value))
+	return repr(value)
+	
+def _cache_file(filename, cache, key):
+	"""Cache file name for a csv file; None if caching is off"""
+	if not cache: return None
+	cache_dir = cache if cache is not True else os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIR)
+	stat = os.stat(filename)
+	key = repr((os.path.abspath(filename), stat.st_size, stat.st_mtime, key))
+	return os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+	
+def _cache_load(cache_file):
+	"""Loads cached object, marks it as recently used"""
+	if not cache_file or not os.path.exists(cache_file): return None
+	try:
+		with open(cache_file, 'rb') as f: 
+			res = pickle.load(f)
+		os.utime(cache_file, None)
+		return res
+	except Exception:
+		return None
+		
+def _cache_save(cache_file, obj):
+	"""Saves object to cache and trims cache directory to CACHE_LIMIT"""
+	if not cache_file: return
+	cache_dir = os.path.dirname(cache_file)
+	temp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+	try:
+		if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+		with open(temp_file, 'wb') as f: 
+			pickle.dump(obj, f, pickle.HIGHEST_PROTOCOL)
+		if os.path.exists(cache_file): os.remove(cache_file)
+		os.rename(temp_file, cache_file)
+	except Exception:
+		print('Could not write CSV cache!')
+		try: os.remove(temp_file)
+		except OSError: pass
+		return
+	_cache_evict(cache_dir, CACHE_LIMIT)
+	
+def _cache_evict(cache_dir, limit):
+	"""Removes least recently used cache files until total size is under limit"""
+	files = []
+	for f in glob(os.path.join(cache_dir, '*.pkl')):
+		try: files.append((os.path.getmtime(f), os.path.getsize(f), f))
+		except OSError: pass
+	total = sum(size for _, size, _ in files)
+	for _, size, f in sorted(files):
+		if total <= limit: break
+		try: os.remove(f)
+		except OSError: continue
+		total -= size
+	
+def _benchmark(rows=100000, cols=10, filename='_csvtable_bench.csv'):
+	"""Compares read_to_list and read_to_table on a rows x cols numeric file"""
+	import os
+	import sys
+	import time
+	
+	def deep_size(obj, seen):
+		if id(obj) in seen: return 0
+		seen.add(id(obj))
+		size = sys.getsizeof(obj)
+		if isinstance(obj, (list, tuple)):
+			size += sum(deep_size(x, seen) for x in obj)
+		elif isinstance(obj, Table):
+			size += sum(deep_size(x, seen) for x in obj._columns)
+		return size
+	
+	with open(filename, 'w') as f:
+		f.write('# generated by CSVTable._benchmark\n')
+		for i in range(rows):
+			f.write(','.join(str(i * 0.5 + j) for j in range(cols)) + '\n')
+	try:
+		res = []
+		for name, fun in (('read_to_list', read_to_list), ('read_to_table', read_to_table)):
+			start = time.time()
+			data = fun(filename)
+			elapsed = time.time() - start
+			res.append((name, elapsed, deep_size(data, set())))
+			data = None
+	finally:
+		os.remove(filename)
+	
+	print('{} cells'.format(rows * cols))
+	for name, elapsed, size in res:
+		print('{:<14} {:7.2f} s {:9.1f} MB'.format(name, elapsed, size / 1024.0**2))
+		
+if __name__ == '__main__':
+	_benchmark()
@@ -2,6 +2,9 @@
 """ Script by Toybich Egor
 """
 import clr
+import atexit
+import threading
+from contextlib import contextmanager
 from System import Type, Activator
 
 
@@ -13,8 +16,101 @@ except:
 import Microsoft.Office.Interop.Excel as Excel
 from System.Runtime.InteropServices import Marshal
 
-__version__ = '1.0.3'
+__version__ = '1.2.0'
 
+class ExcelAppPool(object):
+	"""Keeps Excel applications running to reuse them between ExcelFileReader instances
+	Each reader gets an application for itself and returns it on close()
+	
+		acquire() --> Excel application :waits if max_instances are busy
+		release(app) :returns application to the pool
+		application() :context manager for acquire/release
+		close() :quits all idle applications
+		
+	Args:
+		max_instances: int; maximum number of running Excel applications
+	"""
+	__version__ = '1.0.0'
+	
+	_default = None
+	
+	#====================================================================== 
+	@classmethod
+	def default(cls):
+		"""Pool shared by all readers in this script, closed at exit"""
+		if cls._default is None: 
+			cls._default = cls()
+			atexit.register(cls._default.close)
+		return cls._default
+	
+	#====================================================================== 
+	def __init__(self, max_instances=1):
+		self.max_instances = max(int(max_instances), 1)
+		self._idle = []
+		self._count = 0
+		self._cond = threading.Condition()
+		
+	#====================================================================== 
+	def acquire(self):
+		"""Gets an idle application, starts a new one or waits for one
+		"""
+		with self._cond:
+			while not self._idle and self._count >= self.max_instances:
+				self._cond.wait()
+			if self._idle: return self._idle.pop()
+			self._count += 1
+		try:
+			app = Excel.ApplicationClass()
+			app.Visible = False
+			app.DisplayAlerts = False
+		except:
+			with self._cond:
+				self._count -= 1
+				self._cond.notify()
+			raise
+		print('ExcelAppPool| Excel started ({}/{})'.format(self._count, self.max_instances))
+		return app
+		
+	#====================================================================== 
+	def release(self, app):
+		"""Returns application to the pool
+		"""
+		with self._cond:
+			self._idle.append(app)
+			self._cond.notify()
+	
+	#====================================================================== 
+	@contextmanager
+	def application(self):
+		"""with pool.application() as app: ...
+		"""
+		app = self.acquire()
+		try: yield app
+		finally: self.release(app)
+		
+	#====================================================================== 
+	def close(self):
+		"""Quits all idle applications
+		"""
+		with self._cond:
+			apps, self._idle = self._idle, []
+			self._count -= len(apps)
+		for app in apps:
+			try: app.Quit()
+			except: pass
+			Marshal.FinalReleaseComObject(app)
+		if apps: print('ExcelAppPool| Excel closed ({})'.format(len(apps)))
+			
+	#====================================================================== 
+	def __enter__(self):
+		return self
+	#====================================================================== 
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+	#====================================================================== 
+	def __len__(self):
+		return self._count
+		
 class ExcelFileReader(object):
 	"""Excel Interop adapter class for reading a file
 	Methods (Excel numbers elements from 1, not 0!):
@@ -24,9 +120,20 @@ class ExcelFileReader(object):
 		g_xlr2dict(cell1:str, cell2:str, d_column=1:int) --> dict :gets range to dict with d_column as keys
 		g_active_xlr2list() --> list :gets used range to list
 		g_active_xlr2dict(d_column=1:int)) --> dict :gets used range to dict with d_column as keys
+		close() :closes workbook, returns Excel to the pool or quits it
+		
+	Args:
+		filename: str; workbook path
+		pool: ExcelAppPool or True; reuse Excel from a pool (True for ExcelAppPool.default()),
+			  by default each reader starts and quits its own Excel
+		read_only: bool; open workbook read-only
 		
+	Use as a context manager to close workbook deterministically:
+		with ExcelFileReader(filename, pool=True) as xl: ...
 	"""
-	__version__ = '1.0.2'
+	__version__ = '1.2.0'
+	
+	_max_block_cells = 100000	# cells fetched by one Value2 call
 	
 	#====================================================================== 
 	@property
@@ -43,17 +150,21 @@ class ExcelFileReader(object):
 		print('ExcelFileReader| Done killing...')
 		
 	#====================================================================== 
-	def __init__(self, filename):
+	def __init__(self, filename, pool=None, read_only=True):
 		self._set_none()
 		self._filename = filename
-		self.application = Excel.ApplicationClass()
+		self._pool = ExcelAppPool.default() if pool is True else pool
+		if self._pool is not None:
+			self.application = self._pool.acquire()
+		else:
+			self.application = Excel.ApplicationClass()
 		self.workbooks = self.application.Workbooks
 		try:
-			self.workbook = self.workbooks.Open(filename)
+			self.workbook = self.workbooks.Open(filename, ReadOnly=read_only)
 		except:
 			print('ExcelFileReader| Incorrect path!')
+			self.close()
 			raise
-			self.__del__
 		else:
 			self.worksheets = self.workbook.Worksheets 
 			self.activesheet = self.worksheets[1]
@@ -134,51 +245,93 @@ class ExcelFileReader(object):
 			raise
 			
 	#====================================================================== 		
-	@staticmethod
-	def xlr2list(xlrange):
+	@classmethod
+	def xlr2list(cls, xlrange):
 		"""Converts excel range to python list
+		
+		Values are fetched with one Value2 call per block of rows (whole range
+		if it has less than _max_block_cells cells) instead of one call per cell
 		"""
 		rows = xlrange.Rows
 		columns = xlrange.Columns
 		n = rows.Count
 		m = columns.Count
-
-		vals = [[0] * m for i in range(n)]
-		for i in range(n):
-			for j in range(m):
-				tmp = xlrange[i+1,j+1].Value2
-				try:
-					if int(tmp) == tmp:
-						tmp = int(tmp)
-				except:
-					# tmp = tmp.unicode('utf8')
-					pass
-				# print tmp
-				vals[i][j] = tmp
-					
+		
 		Marshal.FinalReleaseComObject(rows)
 		Marshal.FinalReleaseComObject(columns)
-		Marshal.FinalReleaseComObject(xlrange)
 		rows = None
 		columns = None
+
+		block_rows = max(1, cls._max_block_cells // max(m, 1))
+		vals = []
+		for top in range(0, n, block_rows):
+			count = min(block_rows, n - top)
+			if count == n:
+				vals.extend(cls._value2list(xlrange.Value2, count, m))
+				continue
+			offset = xlrange.Offset[top, 0]
+			block = offset.Resize[count, m]
+			try:
+				vals.extend(cls._value2list(block.Value2, count, m))
+			finally:
+				Marshal.FinalReleaseComObject(block)
+				Marshal.FinalReleaseComObject(offset)
+				block = None
+				offset = None
+					
+		Marshal.FinalReleaseComObject(xlrange)
 		xlrange = None
 		
 		return vals		
 
 	#====================================================================== 	
-	def __del__(self):
-		self.workbook.Close(False)
-		self.application.Quit()
+	@classmethod
+	def _value2list(cls, data, n, m):
+		"""Converts Value2 of a range (2D .NET array or a single value) to list
+		"""
+		if n * m == 1 and not hasattr(data, 'GetLowerBound'):
+			return [[cls._int_coerce(data)]]
+		
+		row0 = data.GetLowerBound(0)
+		col0 = data.GetLowerBound(1)
+		coerce = cls._int_coerce
+		return [[coerce(data[row0 + i, col0 + j]) for j in range(m)] for i in range(n)]
+		
+	#====================================================================== 	
+	@staticmethod
+	def _int_coerce(value):
+		"""Excel stores all numbers as float, return int where possible
+		"""
+		try:
+			if int(value) == value:
+				return int(value)
+		except:
+			pass
+		return value
+
+	#====================================================================== 	
+	def close(self):
+		"""Closes workbook and releases COM objects; Excel goes back to the pool
+		or quits if it's not pooled. Safe to call more than once
+		"""
+		if self.application is None: return
+		if self.workbook is not None: self.workbook.Close(False)
+		
+		for com in (self.activesheet, self.worksheets, self.workbooks, self.workbook):
+			if com is not None: Marshal.FinalReleaseComObject(com)
 		
-		Marshal.FinalReleaseComObject(self.activesheet)
-		Marshal.FinalReleaseComObject(self.worksheets)
-		Marshal.FinalReleaseComObject(self.workbooks)
-		Marshal.FinalReleaseComObject(self.workbook)
-		Marshal.FinalReleaseComObject(self.application)
+		if self._pool is not None:
+			self._pool.release(self.application)
+		else:
+			self.application.Quit()
+			Marshal.FinalReleaseComObject(self.application)
 		
 		self._set_none()
-		# del self.activesheet, self.worksheets, self.workbook
-		# del self.workbooks, self.application
+		
+	#====================================================================== 	
+	def __del__(self):
+		try: self.close()
+		except: pass
 	#====================================================================== 
 	def _set_none(self):
 		self.activesheet = None
@@ -195,8 +348,7 @@ class ExcelFileReader(object):
 		return self.filename
 	#====================================================================== 	
 	def __exit__(self, exc_type, exc_value, traceback):
-		return True
-		self.__del__
+		self.close()
 	#====================================================================== 	
 	def __enter__(self):
 		return self
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+""" Script by Toybich Egor
+Note: Workbench uses IronPython (Python 2.7)!
+Compact storage of exported pictures: duplicates are stored once, PNGs are recompressed
+"""
+#__________________________________________________________
+from __future__ import print_function
+import os
+import json
+import zlib
+import shutil
+import struct
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+try: from Queue import Queue
+except ImportError: from queue import Queue
+
+__version__ = '1.0.0'
+
+STORE_DIR = '_ImageStore'			#: content-addressed store created inside picture directory
+INDEX_FILE = '_image_index.json'	#: pictures which could not be linked: path --> stored file
+EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.avi', '.mp4', '.wmv')
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+def compact(directory, store=None, link=False, repack=True, level=9, threads=4):
+    """
+    Stores every unique picture of a directory (recursively) once
+
+    Unique pictures go to a content-addressed store (<store>/<hash[:2]>/<hash>.<ext>),
+    pictures are removed and listed in INDEX_FILE, use restore() to get them back.
+    With link=True pictures are replaced by hard links to the store instead (where 
+    hard links are available). Linked duplicates are one file: a picture written in
+    place, e.g. by a new export into the same folder, changes all its duplicates and 
+    the store, so restore(link=False) or delete linked pictures before exporting again.
+    PNGs are recompressed before that, one per unique picture.
+
+    Args:
+        directory: str; picture directory
+        store: str; store directory, defaults to STORE_DIR inside directory
+        link: bool; use hard links, False to keep pictures only in store + index
+        repack: bool; recompress PNGs
+        level: int; zlib level for repacking
+        threads: int; threads for hashing and repacking
+    Returns:
+        dict; 'files', 'unique', 'linked', 'indexed', 'repacked', 'size_before', 'size_after' (bytes)
+    """
+    directory = os.path.abspath(directory)
+    store = os.path.abspath(store) if store else os.path.join(directory, STORE_DIR)
+    files = find_pictures(directory, skip=store)
+    res = dict(files=len(files), unique=0, linked=0, indexed=0, repacked=0,
+               size_before=sum(os.path.getsize(f) for f in files), size_after=0)
+    if not files: return res
+
+    # Same content --> same group, first file of a group is repacked and stored
+    groups = OrderedDict()
+    for f, digest in zip(files, _threaded(_file_hash, files, threads)):
+        groups.setdefault(digest, []).append(f)
+    res['unique'] = len(groups)
+
+    heads = [group[0] for group in groups.values()]
+    if repack:
+        todo = [f for f in heads if f.lower().endswith('.png') and _links(f) == 1]
+        saved = _threaded(lambda f: repack_png(f, level), todo, threads)
+        res['repacked'] = sum(1 for s in saved if s > 0)
+
+    index = load_index(directory)
+    for group in groups.values():
+        head = group[0]
+        digest = _file_hash(head)
+        ext = os.path.splitext(head)[1].lower()
+        target = os.path.join(store, digest[:2], digest + ext)
+        if not os.path.isfile(target):
+            if not os.path.isdir(os.path.dirname(target)): os.makedirs(os.path.dirname(target))
+            if not (link and _link(head, target)): shutil.copy2(head, target)
+        res['size_after'] += os.path.getsize(target)
+
+        for f in group:
+            if link and _replace_with_link(target, f):
+                res['linked'] += 1
+            else:
+                os.remove(f)
+                index[_relpath(f, directory)] = _relpath(target, directory)
+                res['indexed'] += 1
+
+    _save_index(directory, index)
+    return res
+
+
+def restore(directory, link=False, store=None):
+    """
+    Puts pictures listed in INDEX_FILE back as copies (or hard links, see compact()).
+    With link=False pictures left as hard links by compact(link=True) get their own copies,
+    so they can be exported again safely
+
+    Args:
+        directory: str; picture directory
+        link: bool; try hard links first
+        store: str; store directory, defaults to STORE_DIR inside directory
+    Returns:
+        int; number of restored pictures
+    """
+    directory = os.path.abspath(directory)
+    store = os.path.abspath(store) if store else os.path.join(directory, STORE_DIR)
+    index = load_index(directory)
+    restored = 0
+    if not link:
+        for f in find_pictures(directory, skip=store):
+            if _links(f) == 1: continue
+            shutil.copy2(f, f + '.copy')
+            os.remove(f)
+            os.rename(f + '.copy', f)
+            restored += 1
+    for path, stored in list(index.items()):
+        dst = os.path.join(directory, path)
+        src = os.path.join(directory, stored)
+        if not os.path.isdir(os.path.dirname(dst)): os.makedirs(os.path.dirname(dst))
+        if not (link and _replace_with_link(src, dst)): shutil.copy2(src, dst)
+        del index[path]
+        restored += 1
+    _save_index(directory, index)
+    return restored
+
+
+def repack_png(filename, level=9):
+    """
+    Recompresses image data of a PNG file with a given zlib level
+    File is replaced only if it gets smaller; pixels and other chunks stay as they are
+
+    Returns:
+        int; bytes saved (0 if not a PNG or not smaller)
+    """
+    with open(filename, 'rb') as f: data = f.read()
+    if data[:8] != _PNG_SIGNATURE: return 0
+
+    chunks, idat, pos = [], [], 8
+    while pos + 8 <= len(data):
+        length, ctype = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if ctype == b'IDAT':
+            if not idat: chunks.append((b'IDAT', None))
+            idat.append(body)
+        else:
+            chunks.append((ctype, body))
+        pos += 12 + length
+        if ctype == b'IEND': break
+    if not idat: return 0
+
+    packed = zlib.compress(zlib.decompress(b''.join(idat)), level)
+    out = [_PNG_SIGNATURE]
+    for ctype, body in chunks:
+        if body is None: body = packed
+        out.append(struct.pack('>I', len(body)) + ctype + body + struct.pack('>I', zlib.crc32(ctype + body) & 0xffffffff))
+    out = b''.join(out)
+    if len(out) >= len(data): return 0
+
+    tmp = filename + '.repack'
+    with open(tmp, 'wb') as f: f.write(out)
+    os.remove(filename)
+    os.rename(tmp, filename)
+    return len(data) - len(out)
+
+
+def find_pictures(directory, skip=None):
+    """Picture files in a directory and its subdirectories (skip: directory to ignore)"""
+    res = []
+    for root, dirs, files in os.walk(directory):
+        if skip: dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != skip]
+        res.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(EXTENSIONS))
+    return sorted(res)
+
+
+def load_index(directory):
+    """Index of pictures kept only in store"""
+    try:
+        with open(os.path.join(directory, INDEX_FILE)) as f: return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+#__________________________________________________________
+def _save_index(directory, index):
+    filename = os.path.join(directory, INDEX_FILE)
+    if index:
+        with open(filename, 'w') as f: json.dump(index, f, indent=1, sort_keys=True)
+    elif os.path.isfile(filename):
+        os.remove(filename)
+
+def _file_hash(filename):
+    """sha1 of file content"""
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024*1024), b''): sha.update(block)
+    return sha.hexdigest()
+
+def _relpath(path, start):
+    return os.path.relpath(path, start).replace('\\', '/')
+
+def _links(filename):
+    """Number of hard links of a file"""
+    try: return os.stat(filename).st_nlink or 1
+    except (OSError, AttributeError): return 1
+
+def _link(src, dst):
+    """Hard link, False if not supported here"""
+    try:
+        os.link(src, dst)
+        return True
+    except (OSError, AttributeError, NotImplementedError):
+        return False
+
+def _replace_with_link(src, dst):
+    """Replaces dst with a hard link to src, False if it's not possible"""
+    try:
+        if os.path.exists(dst) and os.path.samefile(src, dst): return True
+    except (OSError, AttributeError):
+        pass
+    tmp = dst + '.link'
+    if not _link(src, tmp): return False
+    if os.path.exists(dst): os.remove(dst)
+    os.rename(tmp, dst)
+    return True
+
+def _threaded(func, items, threads):
+    """Results of func for every item, computed by a pool of threads"""
+    items = list(items)
+    res = [None] * len(items)
+    errors = []
+    tasks = Queue()
+    for i, item in enumerate(items): tasks.put((i, item))
+
+    def worker():
+        while True:
+            try: i, item = tasks.get_nowait()
+            except Exception: return
+            try: res[i] = func(item)
+            except Exception as err: errors.append(err)
+
+    pool = [threading.Thread(target=worker) for _ in range(max(1, min(threads, len(items))))]
+    for t in pool: t.start()
+    for t in pool: t.join()
+    if errors: raise errors[0]
+    return res
@@ -2,10 +2,26 @@
 """ Script by Toybich Egor
 """
 from __future__ import print_function
+import os
+import re
+import shutil
+import atexit
+import threading
+import time
 from datetime import datetime
 from datetime import timedelta
+from contextlib import contextmanager
 
-__version__ = '1.1.0'
+try: import gzip
+except: gzip = None
+
+try: import fcntl
+except ImportError: fcntl = None
+
+try: import msvcrt
+except ImportError: msvcrt = None
+
+__version__ = '1.3.0'
 
 class Logger(object):
     """
@@ -17,13 +33,31 @@ class Logger(object):
                          the same log file
         info: str; add this strs at the beginning of each message
         console: bool; duplicate output to stdout 
+        max_bytes: int; rotate log file when it grows past this size, 0 to disable
+        max_age: float; rotate log file after this many seconds, 0 to disable
+        backup_count: int; keep this many rotated files (log.1.txt.gz, log.2.txt.gz, ...);
+                           if 0, no rotation is done and old logs are truncated
+        compress: bool; gzip rotated files in a background thread
+        shared: bool; file is shared by several processes, every record is written 
+                      in one append under a lock file and tagged with process id;
+                      max_age then counts from the first record in the file
+        job: str; job name added to the record tag in shared mode
     """
-    __version__ = '1.1.0'
+    __version__ = '1.3.0'
     
     __files_in_use = set()
     
     __total_instances = 0
     
+    # Rotation state is shared by all instances writing into the same file
+    __file_lock = threading.RLock()
+    __file_started = {}
+    __compressors = []
+    __lock_depth = {}
+    __lock_handles = {}
+    
+    _record_time = re.compile(r'^\(\S*\) \[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\]')
+    
     # ---------------------------------------------------------------	
     # Public attributes
     # ---------------------------------------------------------------
@@ -45,18 +79,42 @@ class Logger(object):
     # ---------------------------------------------------------------		
     # Magic methods
     # ---------------------------------------------------------------	
-    def __init__(self, filename='log.txt', alwaysnew=False, info=None, console=True):
+    def __init__(self, filename='log.txt', alwaysnew=False, info=None, console=True,
+                 max_bytes=0, max_age=0, backup_count=0, compress=True, shared=False, job=None):
         self.__info = info
         self._console = console
-
-        if alwaysnew or filename not in self.__class__.__files_in_use:
-            with open(filename, 'w'): pass
-            
         self.__filename = filename
+        self._shared = shared
+        self._job = job
+        
+        self._max_bytes = max(int(max_bytes), 0)
+        self._max_age = max(float(max_age), 0)
+        self._backup_count = max(int(backup_count), 0)
+        self._compress = bool(compress) and gzip is not None
+
+        # Other processes may be writing into a shared file, only alwaysnew resets it
+        new_file = alwaysnew or (filename not in self.__class__.__files_in_use and not shared)
+        
+        with self._locked():
+            if new_file:
+                if self._backup_count and os.path.exists(filename) and os.path.getsize(filename):
+                    self._rollover(force=True)
+                else:
+                    with open(filename, 'w'): pass
+                    self.__file_started[filename] = datetime.now()
+            self.__file_started.setdefault(filename, datetime.now())
         
         self.__files_in_use.add(filename)
         self.__total_instances += 1
         self.__logger_instance = self.__total_instances
+        
+        if shared:
+            tag = [str(os.getpid())]
+            if job: tag.append(str(job))
+            tag.append(str(self.__logger_instance))
+            self.__tag = ':'.join(tag)
+        else:
+            self.__tag = str(self.__logger_instance)
         self.__init_time = datetime.now()
         
         self._log_('New Logger instance created ({})'.format(self.__total_instances))
@@ -77,8 +135,7 @@ class Logger(object):
     
     def blank(self):
         """Prints an empty line in a log file"""
-        with open(self.__filename, 'a') as log_file:
-            log_file.write('\n')	   
+        self._write('\n')
     
     def log(self, msg_log, newln=0, info=''):
         """
@@ -92,23 +149,211 @@ class Logger(object):
         """
         info_msg = info if self.__info is None or info != '' else self.__info   
         info_msg = info_msg + '|| ' if info_msg else ''
-              
-        msg_time='[{}]'.format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        
         msg_actual = str(msg_log).splitlines() if newln != 2 else str(msg_log)
-        with open(self.__filename, 'a') as log_file:
+        # Time is taken under the lock so that a shared file stays time-ordered
+        with self._locked():
+            msg_time='[{}]'.format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
             if newln == 2:
-                log_file.write(msg_actual)
+                self._write(msg_actual)
                 if self._console: print(msg_actual, end='')
             else: 
+                record = []
                 for msg in msg_actual:
-                    mf = '({}) {} {}{}\n'.format(self.__logger_instance, msg_time, info_msg, msg)
-                    log_file.write(mf)
+                    record.append('({}) {} {}{}\n'.format(self.__tag, msg_time, info_msg, msg))
                     if self._console: print('{} {}{}'.format(msg_time, info_msg, msg))
-                if newln == 1: log_file.write('\n')
+                if newln == 1: record.append('\n')
+                self._write(''.join(record))
+    
+    def rollover(self):
+        """Forces log file rotation; does nothing if backup_count is 0"""
+        if not self._backup_count: return
+        with self._locked():
+            self._rollover(force=True)
                 
     def _log_(self, msg, newline=0):
         """Prints message with info of Logger class"""
         self.log(msg, newline, info = str(self.__class__.__name__))
+    
+    # ---------------------------------------------------------------		
+    # Private methods
+    # ---------------------------------------------------------------	
+    def _write(self, text):
+        """Appends text to a log file, rotating it first if needed"""
+        with self._locked():
+            if self._backup_count and self._rotation_due(): self._rollover()
+            if self._shared:
+                # One O_APPEND write per record, no partial lines from other processes
+                fd = os.open(self.__filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+                try: os.write(fd, text.encode('utf-8') if not isinstance(text, bytes) else text)
+                finally: os.close(fd)
+            else:
+                with open(self.__filename, 'a') as log_file:
+                    log_file.write(text)
+    
+    @contextmanager
+    def _locked(self):
+        """
+        Holds the class file lock and, in shared mode, a lock file next to the log.
+        Reentrant within one thread
+        """
+        with self.__file_lock:
+            if not self._shared:
+                yield
+                return
+            filename = self.__filename
+            depth = self.__lock_depth.get(filename, 0)
+            if not depth: self.__lock_handles[filename] = self._lock_file(filename + '.lock')
+            self.__lock_depth[filename] = depth + 1
+            try:
+                yield
+            finally:
+                self.__lock_depth[filename] = depth
+                if not depth: self._unlock_file(self.__lock_handles.pop(filename))
+    
+    def _rotation_due(self):
+        """Checks size and age of a log file against rotation policy"""
+        if self._max_bytes:
+            try: 
+                if os.path.getsize(self.__filename) >= self._max_bytes: return True
+            except OSError: pass
+        if self._max_age:
+            started = self._started()
+            if started and (datetime.now() - started) >= timedelta(seconds=self._max_age):
+                return True
+        return False
+    
+    def _started(self):
+        """
+        When the log file was started. A shared file is started by its first record,
+        so every process sees the same age
+        """
+        if not self._shared: return self.__file_started.get(self.__filename)
+        try:
+            with open(self.__filename) as log_file: first = log_file.readline()
+        except (IOError, OSError): 
+            return None
+        match = self._record_time.match(first)
+        if match: return datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S')
+        return datetime.fromtimestamp(os.path.getctime(self.__filename)) if first else None
+    
+    def _rotated_name(self, num, compressed=False):
+        """Name of a rotated file: log.txt -> log.1.txt(.gz)"""
+        root, ext = os.path.splitext(self.__filename)
+        name = '{}.{}{}'.format(root, num, ext)
+        return name + '.gz' if compressed else name
+    
+    def _rollover(self, force=False):
+        """
+        Starts a new log file, moves the old one into the backup chain. 
+        Must be called while holding the file lock
+        """
+        filename = self.__filename
+        # Another logger on the same file may have rotated it already
+        if not force and not self._rotation_due(): return
+        if not os.path.exists(filename): return
+        
+        # Old log gets a private name and joins the chain only after compression,
+        # so slow compression never blocks logging or other rotations
+        pending = '{}.{}-{}.rotated'.format(filename, os.getpid(), int(time.time()*1e6))
+        os.rename(filename, pending)
+        with open(filename, 'w'): pass
+        self.__file_started[filename] = datetime.now()
+        
+        if self._compress:
+            worker = threading.Thread(target=self._compress_rotated, args=(pending,))
+            worker.daemon = True
+            self.__compressors.append(worker)
+            worker.start()
+        else:
+            self._shift_backups()
+            os.rename(pending, self._rotated_name(1))
+    
+    def _shift_backups(self):
+        """Frees slot 1 in the backup chain, drops the oldest file"""
+        for num in range(self._backup_count, 0, -1):
+            for compressed in (True, False):
+                src = self._rotated_name(num, compressed)
+                if not os.path.exists(src): continue
+                if num == self._backup_count: 
+                    os.remove(src)
+                else:
+                    dst = self._rotated_name(num + 1, compressed)
+                    if os.path.exists(dst): os.remove(dst)
+                    os.rename(src, dst)
+    
+    def _compress_rotated(self, pending):
+        """Background part of rotation"""
+        if self._gzip_file(pending): 
+            src, dst = pending + '.gz', self._rotated_name(1, True)
+        else: 
+            src, dst = pending, self._rotated_name(1)
+        with self._locked():
+            self._shift_backups()
+            os.rename(src, dst)
+    
+    @classmethod
+    def _finish_compression(cls):
+        """Waits for background compression, called at exit"""
+        for worker in list(cls.__compressors):
+            worker.join()
+        del cls.__compressors[:]
+
     # ---------------------------------------------------------------		
     # Static methods
-    # ---------------------------------------------------------------
\ No newline at end of file
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _lock_file(lockname):
+        """
+        Waits for an exclusive OS lock on a lock file and returns its handle.
+        The lock dies with its process, a crashed writer never blocks the log
+        """
+        if fcntl is not None:
+            fd = os.open(lockname, os.O_RDWR | os.O_CREAT)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return fd
+        if hasattr(msvcrt, 'locking'):
+            fd = os.open(lockname, os.O_RDWR | os.O_CREAT)
+            while True:
+                try: 
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    return fd
+                except (IOError, OSError): 
+                    time.sleep(0.002)
+        # IronPython: a file opened without sharing is the lock
+        from System.IO import File, FileMode, FileAccess, FileShare, IOException
+        while True:
+            try: 
+                return File.Open(lockname, FileMode.OpenOrCreate, FileAccess.ReadWrite, getattr(FileShare, 'None'))
+            except IOException: 
+                time.sleep(0.002)
+    
+    @staticmethod
+    def _unlock_file(handle):
+        """Releases a lock taken by _lock_file()"""
+        if not isinstance(handle, int):
+            handle.Close()
+            return
+        if fcntl is not None: 
+            fcntl.flock(handle, fcntl.LOCK_UN)
+        else:
+            os.lseek(handle, 0, 0)
+            msvcrt.locking(handle, msvcrt.LK_UNLCK, 1)
+        os.close(handle)
+    
+    @staticmethod
+    def _gzip_file(filename):
+        """Compresses rotated file, leaves it as is on failure"""
+        try:
+            with open(filename, 'rb') as f_in:
+                with gzip.open(filename + '.gz', 'wb') as f_out:
+                    shutil.copyfileobj(f_in, f_out)
+        except Exception:
+            try: os.remove(filename + '.gz')
+            except OSError: pass
+            return False
+        else:
+            os.remove(filename)
+            return True
+
+atexit.register(Logger._finish_compression)
@@ -0,0 +1,516 @@
+# -*- coding: utf-8 -*-
+""" Script by Toybich Egor
+Note: Workbench uses IronPython (Python 2.7)!
+Fast .wbpz archiving: project files are deflated in parallel by a pool of threads
+"""
+#__________________________________________________________
+from __future__ import print_function
+import os
+import json
+import time
+import zlib
+import shutil
+import struct
+import hashlib
+import zipfile
+import fnmatch
+import threading
+
+from glob import glob
+from collections import deque
+from collections import OrderedDict
+
+try: from Queue import Queue
+except ImportError: from queue import Queue
+
+__version__ = '1.0.0'
+
+SCRATCH = ['_ProjectScratch', '*.lock']		#: never archived
+USER_FILES = 'user_files'					#: directory of user files inside <project>_files
+RESULT_FILES = ['*.rst', '*.rth', '*.rmg', '*.rfl', '*.rcn', '*.rdsp', '*.rfrq', '*.db', '*.dbb',
+                '*.esav', '*.osav', '*.emat', '*.full', '*.mode', '*.sub', '*.ldhi', '*.cnd',
+                '*.page', '*.err', '*.out', '*.res', '*.dat.gz', '*.dat.h5', 'file*.r[0-9]*']	#: solver files, see save_results
+STORED = ('.zip', '.wbpz', '.gz', '.bz2', '.xz', '.7z', '.rar', '.png', '.jpg', '.jpeg', '.gif',
+          '.avi', '.mp4', '.wmv', '.h5')	#: already compressed, stored as is
+
+MANIFEST = '.manifest.json'	#: suffix of base archive state: archives of the chain and file hashes
+DELTA_INFO = '_delta.json'	#: entry of a delta archive: parent archive, deleted and all files
+
+_ZIP64_LIMIT = 0x7fffffff	#: files bigger than that get zip64 headers
+_MAX32 = 0xffffffff
+_SAMPLE = 256*1024			#: start of a file compressed to see if it's worth it
+#__________________________________________________________
+def archive(project, filename, save_results=True, save_userfiles=True, threads=4, level=6):
+    """
+    Writes project file and its _files directory into a .wbpz compatible zip
+
+    Args:
+        project: str; .wbpj file
+        filename: str; archive to write
+        save_results: bool; include solver files (RESULT_FILES and DPs other than dp0)
+        save_userfiles: bool; include user_files directory
+        threads: int; threads compressing files
+        level: int; zlib level
+    Returns:
+        dict; 'files', 'stored' (files not compressed), 'size_in', 'size_out' (bytes), 'time' (s)
+    """
+    start = time.time()
+    with ParallelZipWriter(filename, threads=threads, level=level) as zf:
+        for path, arcname in project_files(project, save_results, save_userfiles):
+            zf.write(path, arcname)
+    return dict(files=zf.files, stored=zf.stored, size_in=zf.size_in,
+                size_out=os.path.getsize(filename), time=time.time() - start)
+
+
+def archive_delta(project, base, save_results=True, save_userfiles=True, threads=4, level=6):
+    """
+    Writes only files changed since the last archive of a chain
+
+    Chain starts with a full archive (base) and its state file <base>.manifest.json with
+    hashes of archived files. Next calls write new and changed files into <base name>.deltaNNN.zip
+    together with DELTA_INFO (deleted files and hashes of all files). Files are hashed
+    only if their size or mtime changed. A new chain is started if base or its state is
+    missing or base was overwritten. Use restore() to get the project back.
+
+    Args:
+        project: str; .wbpj file
+        base: str; full archive of the chain
+        others: see archive()
+    Returns:
+        dict; 'filename' (archive written, None if nothing changed), 'full' (True for a new chain), 'files' (written),
+              'deleted', 'size_in', 'size_out' (bytes), 'time' (s)
+    """
+    start = time.time()
+    files = project_files(project, save_results, save_userfiles)
+    state = load_manifest(base)
+    if state and state.get('base') != _stat(base): state = None
+    manifest = _hash_files(files, state['files'] if state else {}, threads)
+
+    if state is None:
+        res = archive(project, base, save_results, save_userfiles, threads, level)
+        state = dict(archives=[os.path.basename(base)])
+        filename, deleted = base, []
+    else:
+        # Same content: same size and hash, mtime doesn't matter
+        same = lambda a, b: a == b or bool(a and b and a[0::2] == b[0::2])
+        changed = [(path, arcname) for path, arcname in files if not same(state['files'].get(arcname, 0), manifest[arcname])]
+        deleted = sorted(set(state['files']) - set(manifest))
+        if not changed and not deleted:
+            state['files'] = manifest
+            with open(base + MANIFEST, 'w') as f: json.dump(state, f)
+            return dict(filename=None, full=False, files=0, deleted=0, size_in=0, size_out=0, time=time.time() - start)
+        filename = '{}.delta{:03d}.zip'.format(os.path.splitext(base)[0], len(state['archives']))
+        info = dict(parent=state['archives'][-1], deleted=deleted, files=manifest)
+        with ParallelZipWriter(filename, threads=threads, level=level) as zf:
+            for path, arcname in changed: zf.write(path, arcname)
+            zf.writestr(DELTA_INFO, json.dumps(info))
+        res = dict(files=zf.files - 1, size_in=zf.size_in)
+        state['archives'].append(os.path.basename(filename))
+
+    state.update(base=_stat(base), files=manifest)
+    with open(base + MANIFEST, 'w') as f: json.dump(state, f)
+    return dict(filename=filename, full=len(state['archives']) == 1, files=res['files'], deleted=len(deleted),
+                size_in=res['size_in'], size_out=os.path.getsize(filename), time=time.time() - start)
+
+
+def restore(base, directory, deltas=None):
+    """
+    Rebuilds project from a full archive and its delta archives
+
+    Args:
+        base: str; full archive
+        directory: str; directory to unpack project into
+        deltas: list of str; delta archives in order, defaults to the chain from base state file
+                or to all <base name>.deltaNNN.zip
+    Returns:
+        list of str; restored files (arcnames)
+    """
+    if deltas is None:
+        state = load_manifest(base)
+        root = os.path.dirname(os.path.abspath(base))
+        if state: deltas = [os.path.join(root, a) for a in state['archives'][1:]]
+        else: deltas = sorted(glob(os.path.splitext(base)[0] + '.delta[0-9][0-9][0-9].zip'))
+
+    # Last archive which has a file wins; deleted files are forgotten
+    source = OrderedDict()
+    for filename in [base] + list(deltas):
+        with zipfile.ZipFile(filename) as zf:
+            names = zf.namelist()
+            if DELTA_INFO in names:
+                info = json.loads(zf.read(DELTA_INFO).decode('utf-8'))
+                for name in info['deleted']: source.pop(name, None)
+            for name in names:
+                if name != DELTA_INFO: source[name] = filename
+
+    for filename in [base] + list(deltas):
+        with zipfile.ZipFile(filename) as zf:
+            for name in [n for n, f in source.items() if f == filename]:
+                target = os.path.join(directory, *name.rstrip('/').split('/'))
+                if name.endswith('/'):
+                    if not os.path.isdir(target): os.makedirs(target)
+                    continue
+                if not os.path.isdir(os.path.dirname(target)): os.makedirs(os.path.dirname(target))
+                with zf.open(name) as src, open(target, 'wb') as dst: shutil.copyfileobj(src, dst, 1024*1024)
+    return list(source)
+
+
+def load_manifest(base):
+    """State of a delta chain, None if missing or broken"""
+    try:
+        with open(base + MANIFEST) as f: return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def project_files(project, save_results=True, save_userfiles=True):
+    """
+    Files and empty directories to archive: list of (path, arcname), paths relative
+    to project directory as Workbench archives them (<name>.wbpj, <name>_files/...)
+    """
+    project = os.path.abspath(project)
+    root = os.path.dirname(project)
+    files_dir = os.path.splitext(project)[0] + '_files'
+    res = [(project, os.path.basename(project))]
+
+    for dirpath, dirs, files in os.walk(files_dir):
+        rel = os.path.relpath(dirpath, root).replace('\\', '/')
+        top = dirpath == files_dir
+        dirs[:] = sorted(d for d in dirs if not _match(d, SCRATCH) and not (top and (
+                         (not save_userfiles and d == USER_FILES) or
+                         (not save_results and fnmatch.fnmatch(d, 'dp*') and d != 'dp0'))))
+        files = sorted(f for f in files if not _match(f, SCRATCH) and (save_results or not _match(f, RESULT_FILES)))
+        if not dirs and not files: res.append((dirpath, rel + '/'))
+        res.extend((os.path.join(dirpath, f), '{}/{}'.format(rel, f)) for f in files)
+    return res
+
+#__________________________________________________________
+class ParallelZipWriter(object):
+    """
+    Writes zip file, files are compressed by a pool of threads
+
+    Big files are split into chunks compressed independently (joined with sync flush,
+    so they still make one deflate stream); files which don't compress (STORED extensions
+    or a sample of the file) are stored. Data is written in order as soon as it's ready,
+    only a few chunks per thread are kept in memory. Zip64 is used when needed.
+    File is written as <filename>.tmp and renamed on close.
+
+    Arg:
+        filename: str; zip file
+        threads: int; compressing threads
+        level: int; zlib level
+        chunk_size: int; bytes compressed by one task
+
+    Example:
+        with ParallelZipWriter('project.wbpz') as zf:
+            zf.write('project.wbpj')
+            zf.writestr('manifest.json', data)
+    """
+    __version__ = '1.0.0'
+    # ---------------------------------------------------------------
+    # Public attributes
+    # ---------------------------------------------------------------
+    @property
+    def filename(self):
+        return self._filename
+
+    @property
+    def files(self):
+        """Number of files written"""
+        return self._files
+
+    @property
+    def stored(self):
+        """Number of files stored without compression"""
+        return self._stored
+
+    @property
+    def size_in(self):
+        """Total size of written files"""
+        return self._size_in
+    # ---------------------------------------------------------------
+    # Magic methods
+    # ---------------------------------------------------------------
+
+    def __init__(self, filename, threads=4, level=6, chunk_size=4*1024*1024):
+        self._filename = filename
+        self._level = level
+        self._chunk = chunk_size
+        self._threads = max(1, int(threads))
+        self._file = open(filename + '.tmp', 'wb')
+        self._entries = []				#: written entries for central directory
+        self._actions = deque()			#: (action, entry, task) waiting to be written in order
+        self._waiting = 0				#: chunks read but not written yet
+        self._files, self._stored, self._size_in = 0, 0, 0
+
+        self._tasks = Queue()
+        self._pool = [threading.Thread(target=self._worker) for _ in range(self._threads)]
+        for t in self._pool:
+            t.daemon = True
+            t.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None: self.close()
+        else: self.abort()
+
+    # ---------------------------------------------------------------
+    # Public methods
+    # ---------------------------------------------------------------
+
+    def write(self, path, arcname=None, compress=None):
+        """
+        Adds file or directory (without its content) to archive
+
+        Args:
+            path: str; file or directory
+            arcname: str; name in archive, defaults to path
+            compress: bool; None to decide by extension and content
+        """
+        arcname = (arcname or path).replace('\\', '/').lstrip('/')
+        st = os.stat(path)
+        if os.path.isdir(path):
+            entry = self._entry(arcname.rstrip('/') + '/', st.st_mtime, 0, 0x10)
+            self._actions.append(('begin', entry, None))
+            self._actions.append(('end', entry, None))
+            return
+        if compress is None: compress = self._compressible(path)
+
+        entry = self._entry(arcname, st.st_mtime, st.st_size, 0)
+        entry['method'] = 8 if compress else 0
+        self._actions.append(('begin', entry, None))
+        with open(path, 'rb') as f:
+            raw = f.read(self._chunk)
+            while True:
+                following = f.read(self._chunk)
+                self._add_task(entry, raw, last=not following)
+                if not following: break
+                raw = following
+        self._actions.append(('end', entry, None))
+        self._stored += not compress
+
+    def writestr(self, arcname, data, compress=True):
+        """Adds file with given content (bytes or str) to archive"""
+        if not isinstance(data, bytes): data = data.encode('utf-8')
+        entry = self._entry(arcname.replace('\\', '/').lstrip('/'), time.time(), len(data), 0)
+        entry['method'] = 8 if compress else 0
+        self._actions.append(('begin', entry, None))
+        self._add_task(entry, data, last=True)
+        self._actions.append(('end', entry, None))
+        self._stored += not compress
+
+    def close(self):
+        """Writes everything left and central directory, renames archive"""
+        if self._file is None: return
+        try:
+            self._flush(-1)
+            self._write_central()
+        except:
+            self.abort()
+            raise
+        self._stop()
+        self._file.close()
+        self._file = None
+        if os.path.isfile(self._filename): os.remove(self._filename)
+        os.rename(self._filename + '.tmp', self._filename)
+
+    def abort(self):
+        """Stops writing and removes unfinished archive"""
+        if self._file is None: return
+        self._stop()
+        self._file.close()
+        self._file = None
+        try: os.remove(self._filename + '.tmp')
+        except OSError: pass
+
+    # ---------------------------------------------------------------
+    # Private methods
+    # ---------------------------------------------------------------
+
+    def _entry(self, arcname, mtime, size, attr):
+        self._files += attr == 0
+        self._size_in += size
+        name = arcname.encode('utf-8') if not isinstance(arcname, bytes) else arcname
+        try:
+            arcname.encode('ascii')
+            flags = 0
+        except (UnicodeError, AttributeError):
+            flags = 0x800
+        return dict(name=name, flags=flags, method=0, time=self._dos_time(mtime), attr=attr,
+                    zip64=size > _ZIP64_LIMIT, crc=0, csize=0, usize=0, offset=0)
+
+    def _add_task(self, entry, raw, last):
+        task = dict(raw=raw, last=last, data=None, error=None, done=threading.Event())
+        if entry['method'] == 8:
+            self._tasks.put((task, self._level))
+        else:
+            task['data'] = raw
+            task['done'].set()
+        self._actions.append(('data', entry, task))
+        self._waiting += 1
+        if self._waiting > 2 * self._threads: self._flush(self._threads)
+
+    def _flush(self, keep):
+        """Writes ready data in order until no more than keep chunks are waiting (-1 for everything)"""
+        while self._actions and self._waiting > keep:
+            action, entry, task = self._actions.popleft()
+            if action == 'begin':
+                self._write_header(entry)
+            elif action == 'data':
+                task['done'].wait()
+                if task['error'] is not None: raise task['error']
+                entry['crc'] = zlib.crc32(task['raw'], entry['crc'])
+                entry['usize'] += len(task['raw'])
+                entry['csize'] += len(task['data'])
+                self._file.write(task['data'])
+                self._waiting -= 1
+            else:
+                self._patch_header(entry)
+                self._entries.append(entry)
+
+    def _worker(self):
+        while True:
+            item = self._tasks.get()
+            if item is None: return
+            task, level = item
+            try:
+                comp = zlib.compressobj(level, zlib.DEFLATED, -15)
+                task['data'] = comp.compress(task['raw']) + comp.flush(zlib.Z_FINISH if task['last'] else zlib.Z_SYNC_FLUSH)
+            except Exception as err:
+                task['error'] = err
+            task['done'].set()
+
+    def _stop(self):
+        for _ in self._pool: self._tasks.put(None)
+        for t in self._pool: t.join()
+
+    def _write_header(self, entry):
+        entry['offset'] = self._file.tell()
+        extra = struct.pack('<HHQQ', 1, 16, 0, 0) if entry['zip64'] else b''
+        size = _MAX32 if entry['zip64'] else 0
+        self._file.write(struct.pack('<IHHHHHIIIHH', 0x04034b50, 45 if entry['zip64'] else 20, entry['flags'],
+                                     entry['method'], entry['time'][0], entry['time'][1], 0, size, size,
+                                     len(entry['name']), len(extra)))
+        self._file.write(entry['name'] + extra)
+
+    def _patch_header(self, entry):
+        """Writes crc and sizes into local header"""
+        entry['crc'] &= 0xffffffff
+        if not entry['zip64'] and max(entry['csize'], entry['usize']) > _MAX32:
+            raise IOError('File changed while archiving: {}'.format(entry['name']))
+        pos = self._file.tell()
+        self._file.seek(entry['offset'] + 14)
+        if entry['zip64']:
+            self._file.write(struct.pack('<III', entry['crc'], _MAX32, _MAX32))
+            self._file.seek(entry['offset'] + 30 + len(entry['name']) + 4)
+            self._file.write(struct.pack('<QQ', entry['usize'], entry['csize']))
+        else:
+            self._file.write(struct.pack('<III', entry['crc'], entry['csize'], entry['usize']))
+        self._file.seek(pos)
+
+    def _write_central(self):
+        start = self._file.tell()
+        for e in self._entries:
+            big = [v for v in (e['usize'], e['csize'], e['offset']) if v > _MAX32 or e['zip64']]
+            extra = struct.pack('<HH', 1, 8 * len(big)) + struct.pack('<' + 'Q' * len(big), *big) if big else b''
+            clip = lambda v: _MAX32 if v in big else v
+            version = 45 if extra else 20
+            self._file.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, version, version, e['flags'], e['method'],
+                                         e['time'][0], e['time'][1], e['crc'], clip(e['csize']), clip(e['usize']),
+                                         len(e['name']), len(extra), 0, 0, 0, e['attr'], clip(e['offset'])))
+            self._file.write(e['name'] + extra)
+        end = self._file.tell()
+
+        count, size = len(self._entries), end - start
+        if count >= 0xffff or size > _MAX32 or start > _MAX32:
+            self._file.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 0, 0, count, count, size, start))
+            self._file.write(struct.pack('<IIQI', 0x07064b50, 0, end, 1))
+        self._file.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xffff), min(count, 0xffff),
+                                     min(size, _MAX32), min(start, _MAX32), 0))
+
+    def _compressible(self, path):
+        """False for known compressed formats and files whose start doesn't deflate by 5%"""
+        if path.lower().endswith(STORED): return False
+        with open(path, 'rb') as f: sample = f.read(_SAMPLE)
+        if len(sample) < 1024: return True
+        return len(zlib.compress(sample, 1)) < 0.95 * len(sample)
+
+    # ---------------------------------------------------------------
+    # Static methods
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _dos_time(mtime):
+        t = time.localtime(mtime)
+        if t.tm_year < 1980: return 0, (1 << 5) | 1
+        return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+#__________________________________________________________
+def _stat(filename):
+    try: return [os.path.getsize(filename), int(os.path.getmtime(filename))]
+    except OSError: return None
+
+
+def _hash_files(files, previous, threads):
+    """
+    arcname --> [size, mtime, sha1] of files (None for directories);
+    hash from previous is reused if size and mtime are the same
+    """
+    res, todo = {}, Queue()
+    for path, arcname in files:
+        if arcname.endswith('/'):
+            res[arcname] = None
+            continue
+        stat = _stat(path)
+        old = previous.get(arcname)
+        if old and old[:2] == stat: res[arcname] = old
+        else: todo.put((path, arcname, stat))
+
+    def worker():
+        while True:
+            try: path, arcname, stat = todo.get_nowait()
+            except Exception: return
+            sha = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024*1024), b''): sha.update(block)
+            res[arcname] = stat + [sha.hexdigest()]
+
+    pool = [threading.Thread(target=worker) for _ in range(max(1, threads))]
+    for t in pool: t.start()
+    for t in pool: t.join()
+    return res
+
+
+def _match(name, patterns):
+    name = name.lower()
+    return any(fnmatch.fnmatch(name, p.lower()) for p in patterns)
+
+
+def _benchmark(project, threads=4):
+    """Compares zipfile (single thread, like workbench.Archive) with archive() on a project"""
+    import zipfile
+
+    files = project_files(project)
+    res = []
+    start = time.time()
+    with zipfile.ZipFile('_bench_zipfile.wbpz', 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for path, arcname in files: zf.write(path, arcname)
+    res.append(('zipfile', time.time() - start, os.path.getsize('_bench_zipfile.wbpz')))
+    os.remove('_bench_zipfile.wbpz')
+
+    stats = archive(project, '_bench_parallel.wbpz', threads=threads)
+    res.append(('archive({})'.format(threads), stats['time'], stats['size_out']))
+    os.remove('_bench_parallel.wbpz')
+
+    print('{} files, {:.1f} MB'.format(stats['files'], stats['size_in'] / 1024.0**2))
+    for name, elapsed, size in res:
+        print('{:<14} {:7.2f} s {:9.1f} MB'.format(name, elapsed, size / 1024.0**2))
+
+if __name__ == '__main__':
+    # ProjectArchive.py [project.wbpj]               --> benchmark
+    # ProjectArchive.py restore base.wbpz directory  --> project from base archive and its deltas
+    import sys
+    if len(sys.argv) == 4 and sys.argv[1] == 'restore':
+        print('Restored {} files'.format(len(restore(sys.argv[2], sys.argv[3]))))
+    else:
+        _benchmark(sys.argv[1] if len(sys.argv) > 1 else sorted(glob('*.wbpj'))[0])
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+""" Script by Toybich Egor
+Note: Workbench uses IronPython (Python 2.7)!
+Exports pictures of many DPs with several Workbench processes at once
+"""
+#__________________________________________________________
+from __future__ import print_function
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import subprocess
+
+from glob import glob
+from functools import partial
+
+__version__ = '1.0.0'
+
+JOB_FILE = 'render_job.json'		#: job description written into every worker directory
+DONE_FILE = 'render_done.json'		#: results written by a worker when it's finished
+WORKER_SCRIPT = 'render_worker.py'	#: script run by every Workbench process
+MODULES = ['WBInterface', 'Logger', 'CSVTable', 'XlsxFile']	#: copied next to every worker
+#__________________________________________________________
+class RenderFarm(object):
+    """
+    Splits picture export of a solved project between several Workbench batch processes
+
+    Every worker gets its own copy of the project (or archive) in work_dir, opens it,
+    keeps Mechanical open and calls export wrappers of WBInterface for its share of
+    (DP, export) pairs. Pictures are collected into one tree: <pictures>/DP<n>/<file>,
+    names don't depend on which worker rendered them.
+
+    Arg:
+        project: str; .wbpj or .wbpz file to clone, defaults to the first found in cwd
+        workers: int; number of Workbench processes
+        executable: str or list; command to start Workbench in batch mode,
+                    defaults to RunWB2.exe of the newest ANSYS found in AWP_ROOT* variables;
+                    it's called as <executable> -B -R <script>
+        work_dir: str; directory for worker copies
+        pictures: str; directory to collect pictures in
+        logger: object with logger.log(str) method
+        timeout: float; seconds to wait for workers, None to wait forever
+        keep: bool; keep worker directories after collecting pictures
+
+    Example:
+        farm = RenderFarm('project.wbpj', workers=8)
+        exports = [('save_figures', dict(container='SYS', fpref='Result', width=1920, height=1080))]
+        farm.run(exports, dps=range(len(wb.DPs)))
+    """
+    __version__ = '1.0.0'
+
+    _poll = 1.0		#: seconds between checks of running workers
+    # ---------------------------------------------------------------
+    # Public attributes
+    # ---------------------------------------------------------------
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def executable(self):
+        return list(self._executable)
+    # ---------------------------------------------------------------
+    # Magic methods
+    # ---------------------------------------------------------------
+
+    def __init__(self, project=None, workers=4, executable=None, work_dir='_RenderFarm',
+                 pictures='pictures', logger=None, timeout=None, keep=False):
+
+        try: self._log_ = partial(logger.log, info=self.__class__.__name__)
+        except: self._log_ = lambda msg, newline=0: print('RenderFarm| {}'.format(msg))
+
+        self._project = project
+        self._workers = max(1, int(workers))
+        if executable is None: executable = self.find_runwb2()
+        self._executable = [executable] if isinstance(executable, str) else list(executable)
+        self._work_dir = os.path.abspath(work_dir)
+        self._pictures = os.path.abspath(pictures)
+        self._timeout = timeout
+        self._keep = keep
+
+    # ---------------------------------------------------------------
+    # Public methods
+    # ---------------------------------------------------------------
+
+    def run(self, exports, dps):
+        """
+        Renders pictures of DPs in parallel
+
+        Args:
+            exports: list of (method name, kwargs); WBInterface export wrapper and its arguments
+                     without fpath, e.g. ('save_figures', dict(container='SYS', fpref='Result'))
+            dps: list of int; DP numbers (positions in WBInterface.DPs)
+        Returns:
+            dict; 'rendered': number of successful exports, 'failed': list of [dp, method]
+                  not exported, 'returncodes': list of worker exit codes
+        """
+        exports = [[name, dict(kwargs)] for name, kwargs in exports]
+        units = [[dp, i] for dp in dps for i in range(len(exports))]
+        if not units:
+            self._log_('Nothing to render!', 1)
+            return dict(rendered=0, failed=[], returncodes=[])
+
+        project = self._find_project()
+        shares = self.split(units, self._workers)
+        self._log_('Rendering {} exports of {} DPs with {} workers'.format(len(units), len(set(u[0] for u in units)), len(shares)))
+        start = time.time()
+
+        if os.path.exists(self._work_dir): shutil.rmtree(self._work_dir)
+        dirs = []
+        for num, share in enumerate(shares):
+            wdir = os.path.join(self._work_dir, 'worker{}'.format(num))
+            self._prepare_worker(wdir, project, exports, share)
+            dirs.append(wdir)
+        self._log_('Workers prepared in {:.1f} s'.format(time.time() - start))
+
+        codes = self._launch(dirs)
+        res = self._collect(dirs, shares, exports)
+        res['returncodes'] = codes
+
+        if not self._keep: shutil.rmtree(self._work_dir, ignore_errors=True)
+        self._log_('Rendered {} of {} exports in {:.1f} s'.format(res['rendered'], len(units), time.time() - start), 1)
+        if res['failed']: self._log_('Failed: {}'.format(res['failed']), 1)
+        return res
+
+    # ---------------------------------------------------------------
+    # Private methods
+    # ---------------------------------------------------------------
+
+    def _find_project(self):
+        """Project or archive to clone"""
+        srch = [self._project] if self._project else ['*.wbpj', '*.wbpz']
+        for pattern in srch:
+            found = sorted(glob(pattern))
+            if found: return os.path.abspath(found[0])
+        self._log_('Project not found: {}'.format(srch), 1)
+        raise IOError('Project not found: {}'.format(srch))
+    # ---------------------------------------------------------------
+    def _prepare_worker(self, wdir, project, exports, share):
+        """Copies project and modules, writes job and worker script"""
+        os.makedirs(wdir)
+        shutil.copy2(project, wdir)
+        if project.lower().endswith('.wbpj'):
+            files_dir = os.path.splitext(project)[0] + '_files'
+            if os.path.isdir(files_dir):
+                ignore = shutil.ignore_patterns('_ProjectScratch', '*.lock')
+                shutil.copytree(files_dir, os.path.join(wdir, os.path.basename(files_dir)), ignore=ignore)
+
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        for name in MODULES:
+            for f in glob(os.path.join(module_dir, '{}*.py'.format(name))): shutil.copy2(f, wdir)
+        module_file = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+        shutil.copy2(module_file, wdir)
+
+        job = dict(archive=project.lower().endswith('.wbpz'), exports=exports, units=share, pictures='pictures')
+        with open(os.path.join(wdir, JOB_FILE), 'w') as f: json.dump(job, f)
+
+        module = os.path.splitext(os.path.basename(module_file))[0]
+        with open(os.path.join(wdir, WORKER_SCRIPT), 'w') as f:
+            f.write('# Render worker, generated by {}\n'.format(module))
+            f.write('import os, sys\n')
+            f.write('os.chdir(r"{}")\n'.format(wdir))
+            f.write('sys.path.insert(0, r"{}")\n'.format(wdir))
+            f.write('from {} import run_worker\n'.format(module))
+            f.write('run_worker("{}")\n'.format(JOB_FILE))
+    # ---------------------------------------------------------------
+    def _launch(self, dirs):
+        """Starts a Workbench process per worker and waits for all of them"""
+        procs = []
+        for wdir in dirs:
+            out = open(os.path.join(wdir, 'stdout.txt'), 'w')
+            cmd = self._executable + ['-B', '-R', os.path.join(wdir, WORKER_SCRIPT)]
+            procs.append((subprocess.Popen(cmd, cwd=wdir, stdout=out, stderr=subprocess.STDOUT), out))
+        self._log_('Started {} workers: {}'.format(len(procs), ' '.join(self._executable)))
+
+        start = time.time()
+        while any(p.poll() is None for p, _ in procs):
+            if self._timeout is not None and time.time() - start > self._timeout:
+                self._log_('Timeout: stopping workers!')
+                for p, _ in procs:
+                    if p.poll() is None: p.kill()
+                break
+            time.sleep(self._poll)
+
+        codes = []
+        for p, out in procs:
+            codes.append(p.wait())
+            out.close()
+        return codes
+    # ---------------------------------------------------------------
+    def _collect(self, dirs, shares, exports):
+        """Moves pictures of all workers into one tree, reads worker results"""
+        rendered, failed = 0, []
+        for wdir, share in zip(dirs, shares):
+            done = {}
+            try:
+                with open(os.path.join(wdir, DONE_FILE)) as f:
+                    for dp, i, ok in json.load(f): done[(dp, i)] = ok
+            except (IOError, OSError, ValueError):
+                self._log_('No results from {}, see {}'.format(os.path.basename(wdir), os.path.join(wdir, 'stdout.txt')))
+            for dp, i in share:
+                if done.get((dp, i)): rendered += 1
+                else: failed.append([dp, exports[i][0]])
+
+            src_root = os.path.join(wdir, 'pictures')
+            for root, _, files in os.walk(src_root):
+                target = os.path.join(self._pictures, os.path.relpath(root, src_root))
+                if files and not os.path.isdir(target): os.makedirs(target)
+                for name in files:
+                    dst = os.path.join(target, name)
+                    if os.path.exists(dst): os.remove(dst)
+                    shutil.move(os.path.join(root, name), dst)
+        return dict(rendered=rendered, failed=failed)
+
+    # ---------------------------------------------------------------
+    # Static methods
+    # ---------------------------------------------------------------
+    @staticmethod
+    def split(units, parts):
+        """Splits list into <= parts contiguous chunks with sizes differing by 1 at most"""
+        parts = max(1, min(parts, len(units)))
+        size, extra = divmod(len(units), parts)
+        res, start = [], 0
+        for i in range(parts):
+            end = start + size + (i < extra)
+            res.append(units[start:end])
+            start = end
+        return res
+    # ---------------------------------------------------------------
+    @staticmethod
+    def find_runwb2():
+        """RunWB2.exe of the newest ANSYS version from AWP_ROOT<ver> variables, 'RunWB2' otherwise"""
+        roots = [(int(m.group(1)), os.environ[key]) for key in os.environ
+                 for m in [re.match(r'^AWP_ROOT(\d+)$', key)] if m]
+        for _, root in sorted(roots, reverse=True):
+            exe = os.path.join(root, 'Framework', 'bin', 'Win64', 'RunWB2.exe')
+            if os.path.isfile(exe): return exe
+        return 'RunWB2'
+
+#__________________________________________________________
+def run_worker(job_file):
+    """
+    Worker side of RenderFarm, runs inside Workbench
+    Opens the project copy in cwd and exports pictures for its (DP, export) pairs
+    """
+    with open(job_file) as f: job = json.load(f)
+
+    from WBInterface import WBInterface
+    wb = WBInterface(out_file='', full_report_file='')
+    wb.open_any(archive_first=job['archive'])
+
+    results = []
+    exports = job['exports']
+    containers = []
+    for _, kwargs in exports:
+        if kwargs.get('container') not in containers: containers.append(kwargs.get('container'))
+
+    # One Mechanical session per system for all DPs of this worker
+    sessions = [wb.mechanical_session(c) for c in containers if c]
+    opened = []
+    try:
+        for s in sessions:
+            s.__enter__()
+            opened.append(s)
+        active = None
+        for dp, i in job['units']:
+            if dp != active:
+                wb.set_active_DP(wb.DPs[dp])
+                active = dp
+            name, kwargs = exports[i]
+            fpath = os.path.join(os.getcwd(), job['pictures'], 'DP{}'.format(dp))
+            try: ok = bool(getattr(wb, name)(fpath=fpath, **kwargs))
+            except Exception as err_msg:
+                wb._log_('Export {} of DP{} failed: {}'.format(name, dp, err_msg))
+                ok = False
+            results.append([dp, i, ok])
+    finally:
+        for s in reversed(opened): s.__exit__(None, None, None)
+        with open(DONE_FILE, 'w') as f: json.dump(results, f)
+        wb.runtime()
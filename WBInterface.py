@@ -5,11 +5,21 @@ Note: Workbench uses IronPython (Python 2.7)!
 #__________________________________________________________
 from __future__ import print_function
 import os
+import re
+import json
+import time
 import shutil
+import hashlib
+import threading
 
 from glob import glob
 from functools import partial 
+from contextlib import contextmanager
 from collections import defaultdict
+from collections import OrderedDict
+
+try: from Queue import Queue
+except ImportError: from queue import Queue
 
 from csv import reader as csvreader
 from csv import writer as csvwriter
@@ -50,7 +60,26 @@ log_module = find_module('Logger')
 print('WBInterface| Using: {}'.format(log_module))
 if log_module: exec('from {} import Logger'.format(log_module))
 
+# CSVTable module is optional, it's used for reading input tables if found
+CSVTable = None
+csv_module = find_module('CSVTable')
+if csv_module: exec('import {} as CSVTable'.format(csv_module))
+
+# XlsxFile module is optional, it's used for writing outputs to .xlsx if found
+XlsxFileWriter = None
+xlsx_module = find_module('XlsxFile')
+if xlsx_module: exec('from {} import XlsxFileWriter'.format(xlsx_module))
+
+# ProjectArchive module is optional, it's used by archive_project(fast=True) if found
+ProjectArchive = None
+archive_module = find_module('ProjectArchive')
+if archive_module: exec('import {} as ProjectArchive'.format(archive_module))
+
 __version__ = '3.1.6'
+
+_JS_FUNCTION = re.compile(r'function\s+([A-Za-z_$][\w$]*)\s*\(')
+_JS_CALL = re.compile(r'([A-Za-z_$][\w$.]*)\s*\(')
+_DP_MESSAGE = re.compile(r'\b(?:design\s*point|DP)\s*"?(?:DP\s*)?(\d+)', re.IGNORECASE)
 #__________________________________________________________
 class WBInterface(object):
     """
@@ -68,6 +97,12 @@ class WBInterface(object):
         loginfo (str): Prefix for logger to use; defaults to WBInterface
         wb_log: str; file for collecting solver logs, defaults to logger file
         async_timer: float; how often to check for solver logs, default to 0.5 sec
+        csv_cache: bool or str; cache parsed control/input files (needs CSVTable module), 
+                   True for a cache folder next to the files or a cache directory path
+        render_manifest: bool; skip picture exports whose inputs (DP parameters, view arguments,
+                   result files) are unchanged since the last export, see _render_check()
+        status_file: str; per-DP status table written after update, .csv or .json;
+                   not written if not set, see write_dp_status()
         
         Use method log() to write into a log file (see Logger class)
         Use method blank() to write a blank line
@@ -75,8 +110,12 @@ class WBInterface(object):
     __version__ = '3.1.4'
     
     _macro_def_dir = '_TempScript'
-    __macro_dir_path = ''
-    __macros_count = 0    
+    _macro_dir_files = 200					#: macro files kept in _macro_def_dir, least recently used go first
+    _ds_space = 'WB.AppletList.Applet("DSApplet").App.'	#: replaces 'DS.' in JS sent by SendCommand()
+    _js_libs = {}							#: helper JS libraries, built once per class
+    _render_manifest_file = '_render_manifest.json'	#: manifest of pictures written next to them
+    _archive_cache_index = '_archive_cache.json'	#: archive --> hash and state of its unpacked project
+    _archive_cache_max = 2					#: clean copies of unpacked archives kept in cache
     # ---------------------------------------------------------------	
     # Public attributes
     # ---------------------------------------------------------------
@@ -126,8 +165,19 @@ class WBInterface(object):
         
     @property
     def parameters(self):
-        """Returns IO parameters as dictionaries"""
-        return (self._param_in_value, 	self._param_out_value)
+        """
+        Returns IO parameters as dictionaries of lists of str; 
+        numeric input columns read as a table are printed back as Workbench expressions
+        """
+        inputs = defaultdict(list)
+        for key, column in self._param_in_value.items():
+            inputs[key] = column if isinstance(column, list) else [self._value_str(v) for v in column]
+        return (inputs, 	self._param_out_value)
+        
+    @property
+    def input_table(self):
+        """CSVTable.Table of input parameters if they were read from a table, else None"""
+        return self._input_table
         
     @property
     def failed_to_update(self):
@@ -149,6 +199,30 @@ class WBInterface(object):
         """Returns if project is not up-to-date as bool"""
         return self.__not_up_to_date
         
+    @property
+    def dp_status(self):
+        """
+        Per-DP status table of the last update as list of dicts: 'dp' (index), 'name', 
+        'state' ('up-to-date', 'failed', 'skipped' by the disk guard, 'not updated' after 
+        an update stopped on an error, or 'unknown'), 'elapsed' (s, only known 
+        when DPs are updated one by one), 'inputs' (dict), 'messages' (list of str),
+        'attempts' (list of dicts: 'attempt', 'state', 'elapsed', 'cores', 'messages'; see set_retry())
+        """
+        return self._dp_status
+    
+    @property
+    def renders_skipped(self):
+        """Number of picture exports skipped as unchanged"""
+        return self._renders[1]
+    
+    @property
+    def macro_timings(self):
+        """
+        List of (macro name, build time, run time) for every JS macro sent, in seconds;
+        build time counts from the wrapper starting to assemble the macro
+        """
+        return list(self._macro_timings)
+    
     @property
     def ansys_version(self):
         """Returns ANSYS version string"""      
@@ -174,7 +248,8 @@ class WBInterface(object):
     
     def __init__(self, logger = None, out_file='output.txt', full_report_file='full_report.txt', 
                  control_file_template='*_control.csv', input_file_template='*_input.csv', csv_delim=',', 
-                 csv_skip='no', loginfo=None, wb_log='', async_timer=None):
+                 csv_skip='no', loginfo=None, wb_log='', async_timer=None, csv_cache=None, render_manifest=False,
+                 status_file=None):
         """       
         Constructor, duh. Check class docstr for info
         """
@@ -198,9 +273,23 @@ class WBInterface(object):
         self._param_in = []							#: list of workbench input parameters
         self._param_out = []						#: list of workbench output parameters
         self._param_in_value = defaultdict(list)	#: dictionary with input parameters (keys=self._param_in)
+        self._input_table = None					#: CSVTable.Table the input parameters came from
         self._param_out_value = defaultdict(list)	#: dictionary with output parameters (keys=self._param_out)
         self._csv_delim = csv_delim					#: csv file delimiter
         self._csv_skip = csv_skip.lower()			#: string placeholder if no parameter is specified in csv file	
+        self._csv_cache = csv_cache					#: cache for parsed csv files, see CSVTable
+        self._js_queue = None						#: JS macros queued by js_transaction()
+        self._mech_sessions = OrderedDict()			#: (system, component) --> [container, visible, macros sent]
+        self._macro_timings = []					#: (macro name, build time, run time)
+        self._render_manifest = render_manifest		#: skip unchanged picture exports
+        self._render_pending = []					#: exports queued in js_transaction(), recorded after sending
+        self._renders = [0, 0]						#: picture exports [rendered, skipped]
+        self._active_dp = None						#: DP set by set_active_DP()
+        self._retention = None						#: which DPs keep results, see set_retention()
+        self._disk_guard = None						#: disk usage monitoring during update, see set_disk_guard()
+        self._status_file = status_file				#: file for per-DP status table
+        self._dp_status = []						#: per-DP status table, see dp_status
+        self._retry = None							#: update attempts for failed DPs, see set_retry()
         
         self.__workfile = None						#: opened workbench project
         self.__DPs_imported = 0						#: Design Points imported from input file
@@ -255,8 +344,8 @@ class WBInterface(object):
              
     # --------------------------------------------------------------------        
     def __del__(self):   
-        if self.__macro_dir_path and os.path.exists(__macro_dir_path):
-            shutil.rmtree(self.__macro_dir_path, ignore_errors=True)
+        try: self._evict_macro_files()
+        except: pass
     
     def __bool__(self):
         return self.__active
@@ -306,15 +395,15 @@ class WBInterface(object):
                     self._log_('Control file found: ' + self._control_file)
                     self._log_('Reading parameter list...')
                     try:
-                        with open(self._control_file, 'r') as csvfile:
-                            spamreader = csvreader(self.decomment(csvfile), delimiter=csv_delim)
-                            for i, row in enumerate(spamreader):
-                                for rlin in row:
-                                    skip = rlin.lower().find(csv_skip)
-                                    if i == 0 and skip == -1:
-                                        self._param_in.append(self._safeguard(rlin))
-                                    elif i == 1 and skip == -1:
-                                        self._param_out.append(self._safeguard(rlin))
+                        if CSVTable is not None:
+                            rows = CSVTable.read_to_list(self._control_file, csv_delim=csv_delim, cache=self._csv_cache)
+                            # read_to_list() returns None instead of raising
+                            if rows is None: raise IOError('Cannot read ' + self._control_file)
+                            self._read_control_rows(rows, csv_skip)
+                        else:
+                            with open(self._control_file, 'r') as csvfile:
+                                spamreader = csvreader(self.decomment(csvfile), delimiter=csv_delim)
+                                self._read_control_rows(spamreader, csv_skip)
                     except Exception as err_msg:
                         self._log_('An error occured wile reading control file!')
                         self._log_(err_msg, 1)
@@ -325,7 +414,7 @@ class WBInterface(object):
 
             
     # --------------------------------------------------------------------   
-    def read_input(self, input_file_template=None, csv_delim=None):
+    def read_input(self, input_file_template=None, csv_delim=None, rows=None):
         """
         Read csv file with input parameters
         Example of format for 2 parameters and 3 Design Points:
@@ -338,6 +427,9 @@ class WBInterface(object):
         Arg:
             input_file_template: str; search file wioth this pattern, defaults to an init value
             csv_delim: str; csv delimiterl, defaults to an init value
+            rows: tuple; (start, stop) read only this range of Design Points (rows counted from 0,
+                  comments skipped); file is indexed once so the rest of it is not parsed.
+                  Needs CSVTable module
         """
         
         if input_file_template is None: input_file_template=self._input_srch
@@ -351,6 +443,10 @@ class WBInterface(object):
             self._log_('No parameters to input!', 1)
             return
         
+        if rows is not None and CSVTable is None:
+            self._log_('Cannot read rows range: CSVTable module not found!', 1)
+            raise ValueError('Reading rows range requires CSVTable module')
+        
         for defiter in range(2):
             input_used = input_file_template if not defiter else self.__input_srch_default
             msg_mod = '' if not defiter else ' default'
@@ -364,13 +460,28 @@ class WBInterface(object):
                     self._log_('Input file not found!', 1)
                 else:
                     self._log_('Input file found: ' + self._input_file, 1) 
-                    self._log_('Reading input parameters...')
+                    if rows is None: self._log_('Reading input parameters...')
+                    else: self._log_('Reading input parameters, rows {} to {}...'.format(*rows))
                     try:
-                        with open(self._input_file, 'r') as csvfile:
-                            spamreader = csvreader(self.decomment(csvfile), delimiter=csv_delim)
-                            for row in spamreader:
-                                for key, elem in zip(self._param_in, row):
-                                    self._param_in_value[key.upper()].append(elem.strip())
+                        table = None
+                        if CSVTable is not None:
+                            try:
+                                table = CSVTable.read_to_table(self._input_file, names=self._param_in, csv_delim=csv_delim,
+                                                               cache=self._csv_cache, rows=rows)
+                            except ValueError as err_msg:
+                                # Rows shorter than the parameter list don't fit a table
+                                self._log_('Reading input file as text: {}'.format(err_msg))
+                        self._input_table = table
+                        if table is not None:
+                            for key, column in table.items():
+                                self._param_in_value[key.upper()] = column
+                        else:
+                            with open(self._input_file, 'r') as csvfile:
+                                if rows is None: spamreader = csvreader(self.decomment(csvfile), delimiter=csv_delim)
+                                else: spamreader = CSVTable.read_rows(self._input_file, rows[0], rows[1], csv_delim=csv_delim)
+                                for row in spamreader:
+                                    for key, elem in zip(self._param_in, row):
+                                        self._param_in_value[key.upper()].append(elem.strip())
                     except Exception as err_msg:
                         self._log_('An error occured while reading input file!')
                         self._log_(err_msg, 1)
@@ -398,12 +509,18 @@ class WBInterface(object):
         Example of format for 2 parameters and 3 Design Points:
             list = [[1, 2, 3], [10, 20, 30]]
             dict = {'p1':[1, 2, 3], 'p2':[10, 20, 30]}
+        CSVTable.Table is also accepted, its columns are used as is
             
         Arg:
-            inp: list or dict
+            inp: list, dict or CSVTable.Table
         """
         self._log_('Direct data input by name issued')
         
+        if self._is_table(inp):
+            self._input_table_by_name(inp)
+            self._log_('Input successful: {} input(s) in {} Design Point(s)'.format(len(self._param_in),self.__DPs_imported), 1)
+            return
+        
         if not self.is_matrix(inp):
             self._log_('Incorrect input format!')
             raise ValueError('Incorrect input format!')
@@ -423,39 +540,55 @@ class WBInterface(object):
         Example of format for 2 parameters and 3 Design Points:
             inp = [[1, 10], [2, 20], [3, 30]]
             keys = ['p1', 'p2']
+        Rows are consumed one by one, so inp can also be a generator,
+        e.g. CSVTable.iter_rows() (batches of rows are accepted as well)
 
         Arg:
-            inp: list, values for parameters
+            inp: list or iterable, values for parameters
             keys: list, parameter names, defaults to already existing keys
         """
         self._log_('Direct data input by DPs issued')
-        if not self.is_matrix(inp):
-            self._log_('Incorrect input format!')
-            raise ValueError('Incorrect input format!')
         if not self._param_in and keys is None:
             self._log_('No parameter keys found!')
             raise KeysNotFound
-        if len(inp[0]) != len(self._param_in) and keys is None:
+        
+        vkeys = [self._safeguard(key) for key in keys] if keys is not None else list(self._param_in)
+        values = defaultdict(list)
+        row_len = None
+        count = 0
+        for row in self._iter_rows(inp):
+            if row_len is None: row_len = len(row)
+            if len(row) != row_len or (keys is None and row_len != len(vkeys)):
+                self._log_('Incorrect input format!')
+                raise ValueError('Incorrect input format!')
+            for key, elem in zip(vkeys, row):
+                values[key].append(self._value_str(elem))
+            count += 1
+        
+        if not count:
             self._log_('Incorrect input format!')
             raise ValueError('Incorrect input format!')
         
-        vkeys = keys if keys is not None else self._param_in
-        self._param_in = []
-        self._param_in_value = defaultdict(list)
-        for row in inp:
-            for key, elem in zip(vkeys, row):
-                elem_s = str(elem).strip()
-                self._param_in.append(self._safeguard(key))
-                self._param_in_value[self._safeguard(key)].append(elem_s)
-        self.__DPs_imported = len(inp)
+        self._param_in = vkeys
+        self._param_in_value = values
+        self._input_table = None
+        self.__DPs_imported = count
         self._log_('Input successful: {} input(s) in {} Design Point(s)'.format(len(self._param_in),self.__DPs_imported), 1)		
     # --------------------------------------------------------------------     
-    def open_archive(self, archive='*.wbpz'):
+    def open_archive(self, archive='*.wbpz', cache=None, link=False):
         """
         Search for Workbench archive in working directory and open it
         
+        With cache, a clean copy of the unpacked project is kept in cache directory by archive hash
+        (archive is hashed again only if its size or mtime changed). When the same archive is opened
+        next time, project is opened in place if it's unchanged since unpacking, or restored 
+        from the clean copy otherwise; archive is unpacked only if there's no copy.
+        
         Arg:
             archive: str, search for this pattern
+            cache: str, directory for unpacked archives; None to unpack every time
+            link: bool, restore project with hard links to the clean copy instead of copying;
+                  use only if project files are never modified in place
         """
         self._log_('Searching for Workbench archive...')
         try:
@@ -469,11 +602,14 @@ class WBInterface(object):
         self.__workfile = wbpz_file.replace('.wbpz','.wbpj')
         
         self._log_('Archive found: ' + self.__workfile, 1)
-        self._log_('Unpacking archive...')
         
         try:
-            args = dict(ArchivePath=wbpz_file, ProjectPath=self.__workfile, Overwrite=True)
-            workbench.Unarchive(**args)
+            cached = self._open_cached_archive(wbpz_file, cache, link) if cache else False
+            if not cached:
+                self._log_('Unpacking archive...')
+                args = dict(ArchivePath=wbpz_file, ProjectPath=self.__workfile, Overwrite=True)
+                workbench.Unarchive(**args)
+                if cache: self._cache_archive(wbpz_file, cache)
             workbench.ClearMessages()
         except Exception as err_msg:
             self._log_('Unpacking failed!')
@@ -574,7 +710,7 @@ class WBInterface(object):
         try:
             for i, (par, par_values) in enumerate(self._param_in_value.items()):
                 for j, par_value in enumerate(par_values):
-                    self._set_parameter(self.__DPs[j], par, par_value)
+                    self._set_parameter(self.__DPs[j], par, self._value_str(par_value))
         except Exception as err_msg:
             self._log_('An error occured while setting parameters!')
             self._log_(err_msg, 1)
@@ -590,6 +726,10 @@ class WBInterface(object):
             skip_error: bool, skip errors and continue updating
             skip_uncomplete: bool, skip uncomplete Design Points and continue
             save: bool, save project after updating
+            
+        If set_disk_guard() was called, disk usage is monitored during update and with 
+        a guard action DPs are updated one by one so the action can be applied between them.
+        If set_retry() was called, failed DPs are updated again (see dp_status for attempts)
         """
         if not self.__active:
             self._log_('Cannot update project: No active project found!', 1)
@@ -602,7 +742,11 @@ class WBInterface(object):
         self.__not_up_to_date = False
         
         self._param_out_value = defaultdict(list)
+        self._dp_status = []
              
+        times, skipped, status, stop = {}, [], None, False
+        monitor = self._disk_monitor() if self._disk_guard else None
+        if monitor: monitor.start()
         self.start_logwatch()
         start_time = datetime.now()
         try:                     
@@ -611,7 +755,9 @@ class WBInterface(object):
                 args = dict(ErrorBehavior='SkipDesignPoint' if skip_error else 'Stop',
                             CannotCompleteBehavior='Continue' if skip_uncomplete else 'Stop',
                             DesignPoints=self.__DPs)                          
-                workbench.UpdateAllDesignPoints(**args) 
+                stop = 'Stop' in (args['ErrorBehavior'], args['CannotCompleteBehavior'])
+                skipped = self._update_DPs(self.__DPs, args, monitor, times)
+                if self._retry: status, skipped = self._retry_failed(args, monitor, times, skipped)
         except Exception as err_msg:  
             self._log_('Project failed to update!')
             self._log_(err_msg, 1)
@@ -619,27 +765,42 @@ class WBInterface(object):
         finally:
             self.__solved = True
             self.stop_logwatch()
+            if monitor: monitor.stop()
             if save: self._save_project()                      
         
         sol_time = datetime.now() - start_time
         sol_time = timedelta(days=sol_time.days, seconds=sol_time.seconds, microseconds=0)
         self._log_('Elapsed solution time: {}'.format(sol_time) ,)
         
-        if workbench.IsProjectUpToDate():
+        messages = self._get_messages()
+        up_to_date = workbench.IsProjectUpToDate()
+        if up_to_date:
             self._log_('Update successful', 1)
         else:
             self.__not_up_to_date = True
             self._log_('Project is not up-to-date, see messages below')
-            for msg in workbench.GetMessages():
-                try: self._log_(msg.MessageType + ": " + msg.Summary)  
-                except: pass
+            for msg_type, summary in messages:
+                self._log_(msg_type + ": " + summary)  
             self._logger.blank()
+            
+        if status is None: 
+            status = self._collect_dp_status(messages, times, skipped, not self.__failed_to_update, stop=stop)
+        self._dp_status = status
+        self.write_dp_status()
         return True
     # --------------------------------------------------------------------     
-    def archive_project(self, filename=None, save_external_files=True, save_results=True, save_userfiles=True):
+    def archive_project(self, filename=None, save_external_files=True, save_results=True, save_userfiles=True, 
+                        fast=False, threads=4, delta=False):
         """
         Archives Workbench project
         
+        With fast=True archive is written by ProjectArchive module: files are compressed 
+        in parallel and already compressed files are stored as is. Falls back to
+        workbench.Archive if the project uses files outside of its directory.
+        With delta=True (implies fast) only files changed since the last archive with the same
+        name are written to <name>.deltaNNN.zip; see ProjectArchive.restore() to unpack them.
+        If set_retention() was called, results are pruned by prune_results() first.
+        
         
         Arg:
             filename: str, archive filename; can be relative or absolute, can be just a directory;
@@ -647,12 +808,16 @@ class WBInterface(object):
             save_external_files: bool, saves external files; defaults to True
             save_results: bool, saves result files; defaults to True
             save_userfiles: bool, saves files in user_files directory; defaults to True
+            fast: bool, use ProjectArchive module instead of workbench.Archive
+            threads: int, compressing threads for fast archiving
+            delta: bool, write delta archive; first call writes full archive
             
         """
         if not self.__active:
             self._log_('Cannot archive project: No active project found!', 1)
             raise NoActiveProjectFound                  
         
+        if self._retention: self.prune_results()
         self._save_project() 
         
         self._log_('Archiving Workbench project...')
@@ -686,32 +851,220 @@ class WBInterface(object):
             self._log_(err_msg, 1)
             return False
             
+        fast = fast or delta
+        if fast and ProjectArchive is None:
+            self._log_('ProjectArchive module not found, using workbench.Archive')
+            fast = False
+        if fast and save_external_files:
+            external = self._external_files()
+            if external is None:
+                self._log_('Cannot list external files, they are not archived!')
+            elif external:
+                self._log_('Project uses {} external files, using workbench.Archive'.format(len(external)))
+                fast = False
+            
         args = dict(FilePath=wbpz_file, FailIfMissingFiles=False, IncludeExternalImportedFiles=bool(save_external_files), 
                     IncludeSkippedFiles=bool(save_results), IncludeUserFiles=bool(save_userfiles))                                          
+        start = time.time()
         try:
-            workbench.Archive(**args)
+            if fast and delta:
+                res = ProjectArchive.archive_delta(self.__workfile, wbpz_file, save_results=bool(save_results), 
+                                                   save_userfiles=bool(save_userfiles), threads=threads)
+                if res['filename'] is None:
+                    self._log_('Nothing changed since the last archive', 1)
+                    return True
+                wbpz_file = res['filename']
+                self._log_('{} archive: {} files written, {} deleted; {:.1f} MB'.format('Full' if res['full'] else 'Delta',
+                           res['files'], res['deleted'], res['size_out'] / 1024.0**2))
+            elif fast:
+                res = ProjectArchive.archive(self.__workfile, wbpz_file, save_results=bool(save_results), 
+                                             save_userfiles=bool(save_userfiles), threads=threads)
+                self._log_('Archived {} files ({} stored as is): {:.1f} MB -> {:.1f} MB'.format(
+                           res['files'], res['stored'], res['size_in'] / 1024.0**2, res['size_out'] / 1024.0**2))
+            else:
+                workbench.Archive(**args)
         except Exception as err_msg:
             self._log_('Archiving failed!')
             self._log_(err_msg, 1)
             return False
         else:
-            self._log_('Project archived successfully to {}'.format(wbpz_file), 1)
+            self._log_('Project archived successfully to {} in {:.1f} s'.format(wbpz_file, time.time() - start), 1)
             return True
     
      # --------------------------------------------------------------------     
-    def archive_if_complete(self, threshold_status=2):
+    def archive_if_complete(self, threshold_status=2, **kwargs):
         """
         Archives project if project status is less or equal to threshold_status
         
         Args:
             threshold_status: int, see status() method for more information; defaults to 'FAILED TO UPDATE!' status
+            kwargs: passed to archive_project()
         """
         if not (0 <= threshold_status <= 4) or not isinstance(threshold_status, int):
             self._log_('Cannot archive project: incorrect status threshold!', 1)
             return False
         if self.status(suppress=True) <= threshold_status: 
-            res = self.archive_project()
+            res = self.archive_project(**kwargs)
             return res
+    # --------------------------------------------------------------------
+    def write_dp_status(self, filename=None):
+        """
+        Writes per-DP status table of the last update (see dp_status) 
+        
+        Args:
+            filename: str, .json for a list of dicts, csv otherwise; defaults to status_file
+        """
+        if filename is None: filename = self._status_file
+        if not filename or not self._dp_status: return None
+        
+        try:
+            if filename.lower().endswith('.json'):
+                with open(filename, 'w') as f: json.dump(self._dp_status, f, indent=1)
+            else:
+                inputs = list(self._dp_status[0]['inputs'])
+                with open(filename, 'w') as f:
+                    out_writer = csvwriter(f, delimiter=self._csv_delim, quotechar='"', quoting=QUOTE_MINIMAL)
+                    out_writer.writerow(['dp', 'name', 'state', 'elapsed'] + inputs + ['attempts', 'messages'])
+                    for row in self._dp_status:
+                        elapsed = '' if row['elapsed'] is None else '{:.1f}'.format(row['elapsed'])
+                        attempts = ' -> '.join(a['state'] for a in row['attempts'])
+                        if len(row['attempts']) > 1:
+                            messages = ['#{} {}'.format(a['attempt'], m) for a in row['attempts'] for m in a['messages']]
+                        else: 
+                            messages = row['messages']
+                        out_writer.writerow([row['dp'], row['name'], row['state'], elapsed] + 
+                                            [row['inputs'].get(p, '') for p in inputs] + [attempts, ' | '.join(messages)])
+        except Exception as err_msg:
+            self._log_('Failed to write DP status to {}!'.format(filename))
+            self._log_(err_msg, 1)
+            return None
+        self._log_('DP status written to {}'.format(filename), 1)
+        return filename
+    # --------------------------------------------------------------------
+    def set_retry(self, attempts=2, cores=None, container='SYS', callback=None):
+        """
+        Makes update_project() update failed DPs again
+        
+        Args:
+            attempts: int, maximum number of updates of a DP, including the first one
+            cores: int or list, number of cores for retries set by set_cores_number(); 
+                   list gives a value for every retry (the last one is used for the rest);
+                   the number of cores before retries is set back after them
+            container: str, system for set_cores_number()
+            callback: function(wb, attempt, dps) called before every retry, e.g. to change 
+                      solver settings; attempt starts from 2, dps are failed DPs
+        """
+        if isinstance(cores, int): cores = [cores]
+        self._retry = dict(attempts=int(attempts), cores=cores or [], container=container, callback=callback)
+        self._log_('Retry: up to {} attempts per DP{}'.format(attempts, 
+                   ', cores: {}'.format(cores) if cores else ''), 1)
+    # --------------------------------------------------------------------
+    def set_disk_guard(self, min_free=0, action=None, timer=10, outfile='disk_usage.csv', max_pause=3600):
+        """
+        Monitors disk usage during update_project(), see DiskUsageMonitor
+        
+        Args:
+            min_free: float, free space threshold in MB; 0 to only record disk usage
+            action: str, what to do when free space drops below min_free, checked between DPs:
+                    'prune' - prune_results() for DPs updated so far and stop if it's not
+                              enough, needs set_retention() first,
+                    'pause' - wait until there's enough space, 'stop' - stop update; 
+                    None to only log it
+            timer: float, sample every <timer> seconds
+            outfile: str, csv file for time series; '' to not write it
+            max_pause: float, 'pause' waits at most this many seconds, then stops update
+        """
+        if action not in (None, 'prune', 'pause', 'stop'):
+            self._log_('Cannot set disk guard: unknown action {}!'.format(action), 1)
+            raise ValueError(action)
+        if action == 'prune' and not self._retention:
+            self._log_('Cannot set disk guard: action "prune" needs set_retention() first!', 1)
+            raise ValueError(action)
+        self._disk_guard = dict(min_free=min_free, action=action, timer=timer, outfile=outfile, max_pause=max_pause)
+        self._log_('Disk guard: {} MB free, action: {}'.format(min_free, action), 1)
+    # --------------------------------------------------------------------
+    def set_retention(self, parameter=None, keep=1, mode='min', keep_failed=True):
+        """
+        Sets which DPs keep their results, applied by archive_project() (see prune_results())
+        Current DP (dp0) always keeps its results
+        
+        Args:
+            parameter: str, output parameter to rank up-to-date DPs by; None to keep only failed DPs
+            keep: int, number of DPs to keep by rank
+            mode: str, 'min' keeps DPs with the smallest values, 'max' - with the largest
+            keep_failed: bool, keep results of DPs which failed to update (see dp_status) 
+                         or whose parameter can't be read as a number
+        """
+        if mode not in ('min', 'max'):
+            self._log_('Cannot set retention: mode should be "min" or "max"!', 1)
+            raise ValueError(mode)
+        self._retention = dict(parameter=parameter, keep=int(keep), mode=mode, keep_failed=keep_failed)
+        self._log_('Retention: {} DPs by {} of {}{}'.format(keep, mode, parameter, 
+                   ', failed DPs' if keep_failed else ''), 1)
+    # --------------------------------------------------------------------
+    def prune_results(self, dps=None):
+        """
+        Drops results of DPs not kept by set_retention(): DPs are not retained anymore and
+        their dp<n> folders are deleted, _ProjectScratch folder of the project is deleted too.
+        DPs which are neither up-to-date nor failed (not updated yet) keep their results.
+        Does nothing if set_retention() wasn't called
+        
+        Args:
+            dps: list, DPs to prune, defaults to all
+        Returns:
+            dict, 'kept' and 'pruned' (DP names), 'reclaimed' (bytes); None without retention policy
+        """
+        if not self.__active:
+            self._log_('Cannot prune results: No active project found!', 1)
+            raise NoActiveProjectFound
+        
+        policy = self._retention
+        if not policy:
+            self._log_('Cannot prune results: no retention policy, see set_retention()!', 1)
+            return None
+        self._log_('Pruning results...')
+        
+        states = self._dp_states()
+        dps = [dp for dp in (self.__DPs if dps is None else dps) if dp.Name != '0']
+        values, failed, keep = [], [], []
+        for dp in dps:
+            state = states.get(dp.Name)
+            if state == 'failed': 
+                failed.append(dp)
+                continue
+            if state not in ('up-to-date', 'unknown'): 
+                keep.append(dp)
+                continue
+            try: 
+                val = float(self._get_parameter_value(dp, policy['parameter'])) if policy['parameter'] else 0.0
+                if val != val: raise ValueError('nan')
+            except Exception:
+                failed.append(dp)
+            else:
+                values.append((val, dp))
+                
+        values.sort(key=lambda v: v[0], reverse=policy['mode'] == 'max')
+        if policy['parameter']: keep += [dp for _, dp in values[:policy['keep']]]
+        if policy['keep_failed']: keep += failed
+        pruned = [dp for dp in dps if dp not in keep]
+        
+        files_dir = os.path.splitext(os.path.abspath(self.__workfile))[0] + '_files'
+        scratch = [os.path.join(files_dir, '_ProjectScratch')]
+        size_before = self._dir_size(files_dir) + sum(self._dir_size(d) for d in scratch)
+        
+        for dp in pruned:
+            try: dp.Retained = False
+            except Exception as err_msg:
+                self._log_('Failed to unretain DP{}: {}'.format(dp.Name, err_msg))
+        if pruned: self._save_project()
+        
+        for d in [os.path.join(files_dir, 'dp' + dp.Name) for dp in pruned] + scratch:
+            if os.path.isdir(d): shutil.rmtree(d, ignore_errors=True)
+        
+        reclaimed = size_before - self._dir_size(files_dir) - sum(self._dir_size(d) for d in scratch)
+        self._log_('Kept results of {} DPs, pruned {}; reclaimed {:.1f} MB'.format(
+                   len(keep), len(pruned), reclaimed / 1024.0**2), 1)
+        return dict(kept=[dp.Name for dp in keep], pruned=[dp.Name for dp in pruned], reclaimed=reclaimed)
     # --------------------------------------------------------------------    
     
     def set_output(self, out_par=None):
@@ -749,6 +1102,9 @@ class WBInterface(object):
         """
         Output parameters in a file. Set output_file_name = '' to suppress
         output to a file
+        If output_file_name ends with '.xlsx' (needs XlsxFile module) rows are 
+        streamed to a new sheet of this workbook DP by DP and are not stored internally,
+        fkey with 'a' keeps sheets of previous runs. Returns number of written rows then.
         
         Args:
             output_file_name: str, write to this file, if empty - output internally only
@@ -770,6 +1126,9 @@ class WBInterface(object):
                 raise MissingCSVParameter
             
             self._param_out_value = defaultdict(list)
+            if output_file_name and output_file_name.lower().endswith('.xlsx'):
+                return self._output_xlsx(output_file_name, append='a' in fkey)
+                
             self._log_('Retrieving output parameters... ')
         
             try:
@@ -808,9 +1167,12 @@ class WBInterface(object):
               
     # --------------------------------------------------------------------
     def set_active_DP(self, dp):
-        """Sets active DP"""
+        """Sets active DP, editors opened by mechanical_session() are refreshed"""
         try: workbench.Parameters.SetBaseDesignPoint(DesignPoint=dp)
         except: pass
+        self._active_dp = dp
+        for (sys, comp), session in self._mech_sessions.items():
+            self._refresh_session(sys, comp, session)
     
     # --------------------------------------------------------------------
     def export_wb_report(self, full_report_file=None):
@@ -836,11 +1198,13 @@ class WBInterface(object):
             self._log_('Cannot export Workbench report: file name is not defined!', 1)
     
     
-    def copy_from_userfiles(self, template_str, target):
-        self.copy_files(template_str, workbench.GetUserFilesDirectory() , target)
+    def copy_from_userfiles(self, template_str, target, **kwargs):
+        """Copies files from user_files directory, kwargs are passed to copy_files()"""
+        return self.copy_files(template_str, workbench.GetUserFilesDirectory() , target, log=self._log_, **kwargs)
         
-    def move_from_userfiles(self, template_str, target):
-        self.move_files(template_str, workbench.GetUserFilesDirectory() , target)
+    def move_from_userfiles(self, template_str, target, **kwargs):
+        """Moves files from user_files directory, kwargs are passed to move_files()"""
+        return self.move_files(template_str, workbench.GetUserFilesDirectory() , target, log=self._log_, **kwargs)
         
     def delete_from_userfiles(self, template_str):
         self.delete_files(template_str, workbench.GetUserFilesDirectory())
@@ -909,6 +1273,8 @@ class WBInterface(object):
         Call this at the end of your script. Calls success_status() and runtime() 
         """
         self.success_status()
+        if self._render_manifest and sum(self._renders):
+            self._log_('Picture exports: {} rendered, {} skipped as unchanged'.format(*self._renders))
         self._log_('END RUN', 1)
         self.runtime()       
     
@@ -953,6 +1319,7 @@ class WBInterface(object):
         
         # jscode = 'DS.Script.Configure_setNumberOfCores("{}")'.format(value)
         
+        build_start = time.time()
         jsfun = '''
              function setNumberOfCores(value)
              {
@@ -982,7 +1349,7 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
         
         try:
-            self._send_js_macro(container, jscode, module)
+            self._send_js_macro(container, jscode, module, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1)
@@ -1014,6 +1381,7 @@ class WBInterface(object):
         else:
             self._log_('Distributed solver: Disabled')
             
+        build_start = time.time()
         jsfun = '''
             function setDMP(value)
             {
@@ -1038,7 +1406,7 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
         
         try:
-            self._send_js_macro(container, jscode, module)
+            self._send_js_macro(container, jscode, module, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1)
@@ -1086,8 +1454,13 @@ class WBInterface(object):
         
         self._log_('Saving model overview in {}'.format(os.path.join(fpath, filename)))      
         if not os.path.exists(fpath): os.makedirs(fpath)
+        
+        args = (width, height, fontfact, zoom_to_fit, view)
+        skip, render = self._render_check('save_overview', container, module, fpath, basename + '.', args)
+        if skip: return True
                     
-        jsfun = self.__jsfun_savepics() + '''
+        build_start = time.time()
+        jsfun = self._js_lib('savepics') + '''
             function DumpOverview(pdir, pHeight, pWidth, pFontFactor, pFit, pName, pMode, pView) {                                          
                 var clsidModel = 104; // model
                
@@ -1128,12 +1501,14 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
          
         try:
-            self._send_js_macro(container, jscode, module, visible=True)
+            res = self._send_js_macro(container, jscode, module, visible=True, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1) 
             return False
-        else: return True
+        else: 
+            if res: self._render_record(render)
+            return True
     # -------------------------------------------------------------------- 
     def save_mesh_view(self, container, fpath, filename, width=0, height=0, fontfact=1, zoom_to_fit=True, view='iso', module='Model', ignore_js_err=True):
         """
@@ -1174,8 +1549,13 @@ class WBInterface(object):
         
         self._log_('Saving mesh view in {}'.format(os.path.join(fpath, filename)))      
         if not os.path.exists(fpath): os.makedirs(fpath)
+        
+        args = (width, height, fontfact, zoom_to_fit, view)
+        skip, render = self._render_check('save_mesh_view', container, module, fpath, basename + '.', args)
+        if skip: return True
                     
-        jsfun = self.__jsfun_savepics() + '''
+        build_start = time.time()
+        jsfun = self._js_lib('savepics') + '''
             function DumpMesh(pdir, pHeight, pWidth, pFontFactor, pFit, pName, pMode, pView) {                                          
                 var clsidMesh = 127; // mesh
                
@@ -1216,12 +1596,14 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
          
         try:
-            self._send_js_macro(container, jscode, module, visible=True)
+            res = self._send_js_macro(container, jscode, module, visible=True, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1) 
             return False
-        else: return True
+        else: 
+            if res: self._render_record(render)
+            return True
        
     def save_setups_view(self, container, fpath, fpref='Setup', width=0, height=0, fontfact=1, zoom_to_fit=True, view='iso', module='Model', ignore_js_err=True):
         """
@@ -1252,7 +1634,12 @@ class WBInterface(object):
         self._log_('Saving all environment setups in {}'.format(fpath))      
         if not os.path.exists(fpath): os.makedirs(fpath)
         
-        jsfun = self.__jsfun_savepics() + '''
+        args = (width, height, fontfact, zoom_to_fit, view)
+        skip, render = self._render_check('save_setups_view', container, module, fpath, fpref + '_', args)
+        if skip: return True
+        
+        build_start = time.time()
+        jsfun = self._js_lib('savepics') + '''
             function DumpSetups(pdir, pHeight, pWidth, pFontFactor, pFit, pPref, pView) {                                          
                 var clsidEnv = 105; // load cases
                
@@ -1291,12 +1678,14 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
          
         try:
-            self._send_js_macro(container, jscode, module, visible=True)
+            res = self._send_js_macro(container, jscode, module, visible=True, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1) 
             return False
-        else: return True
+        else: 
+            if res: self._render_record(render)
+            return True
         
     # -------------------------------------------------------------------- 
     def save_figures(self, container, fpath, fpref='Result', width=0, height=0, fontfact=1, zoom_to_fit=False, view=0, shade_mode='ShowUndeformedWireframe', module='Model', ignore_js_err=True):
@@ -1337,9 +1726,14 @@ class WBInterface(object):
         self._log_('Saving all figures in {}'.format(fpath))
         
         if not os.path.exists(fpath): os.makedirs(fpath)
+        
+        args = (width, height, fontfact, zoom_to_fit, view, shade_mode)
+        skip, render = self._render_check('save_figures', container, module, fpath, fpref + '_', args)
+        if skip: return True
 
         
-        jsfun = self.__jsfun_savepics() + '''
+        build_start = time.time()
+        jsfun = self._js_lib('savepics') + '''
             function DumpAllFigures(pdir, pHeight, pWidth, pFontFactor, pFit, pPref, pView, pWireMode) {                                          
                 var clsidFigure = 147; // figures
                 
@@ -1382,12 +1776,14 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
          
         try:
-            self._send_js_macro(container, jscode, module, visible=True)
+            res = self._send_js_macro(container, jscode, module, visible=True, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1) 
             return False
-        else: return True
+        else: 
+            if res: self._render_record(render)
+            return True
    # -------------------------------------------------------------------- 
     def save_animations(self, container, fpath, fpref='Animation', width=0, height=0, scale="auto", frames=20, zoom_to_fit=True, view='iso', shade_mode='ShowWireframe', module='Model', ignore_js_err=False):
         """
@@ -1430,7 +1826,12 @@ class WBInterface(object):
         
         if not os.path.exists(fpath): os.makedirs(fpath)
         
-        jsfun = self.__jsfun_setscale() + self.__jsfun_edgeproc() + '''
+        args = (width, height, scale, frames, zoom_to_fit, view, shade_mode)
+        skip, render = self._render_check('save_animations', container, module, fpath, fpref + '_', args)
+        if skip: return True
+        
+        build_start = time.time()
+        jsfun = self._js_lib('setscale') + self._js_lib('edgeproc') + '''
             function doAnimationFilename(fName, pHeight, pWidth, pFrames)
             {
                 var avi = /.avi$/i;   // $=end of string,  i=case insensitive
@@ -1659,12 +2060,14 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
          
         try:
-            self._send_js_macro(container, jscode, module, visible=True)
+            res = self._send_js_macro(container, jscode, module, visible=True, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1) 
             return False
-        else: return True
+        else: 
+            if res: self._render_record(render)
+            return True
     # -------------------------------------------------------------------- 
     def set_unit_system(self, container, unit_sys, module='Model', ignore_js_err=True):
         """
@@ -1730,6 +2133,7 @@ class WBInterface(object):
         
         self._log_('Setting units to {}: {}'.format(unit_sys, unit_msg))
         
+        build_start = time.time()
         jsfun = '''
             function setUnits(sysId) {               
                 DS.UnitSystemID = sysId;
@@ -1744,7 +2148,7 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
          
         try:
-            self._send_js_macro(container, jscode, module, visible=True)
+            self._send_js_macro(container, jscode, module, visible=True, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1) 
@@ -1778,7 +2182,8 @@ class WBInterface(object):
         
         self._log_('Setting figures scale to {}'.format(msg))
         
-        jsfun = self.__jsfun_setscale() + '''
+        build_start = time.time()
+        jsfun = self._js_lib('setscale') + '''
             function setScale(pScale) {    
                 var clsidFigure = 147; // figures
                 
@@ -1809,7 +2214,7 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
          
         try:
-            self._send_js_macro(container, jscode, module, visible=True)
+            self._send_js_macro(container, jscode, module, visible=True, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1) 
@@ -1821,6 +2226,7 @@ class WBInterface(object):
 
         self._log_('Show all hidden bodies')
         
+        build_start = time.time()
         jsfun = ''
         
         jsmain = '''DS.Script.doShowAllParts();'''
@@ -1829,7 +2235,7 @@ class WBInterface(object):
         else: jscode = jsfun + jsmain
          
         try:
-            self._send_js_macro(container, jscode, module, visible=True)
+            self._send_js_macro(container, jscode, module, visible=True, build_start=build_start)
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1) 
@@ -1838,8 +2244,9 @@ class WBInterface(object):
     # -------------------------------------------------------------------- 
     def send_act_macro(self, sys, code, ext='py', comp='Model'): 
         """
-        !!!!THIS IS WiP AND NOT FUNCTIONAL!!!!
         Sends Python/JScript code to Mechanical in-build macro executor
+        Code is saved in _macro_def_dir under its content hash, so the same 
+        macro is written only once and reused by later calls and runs
         
         Arg:
             sys: str; specify a Mechanical system, e.g. 'SYS'
@@ -1847,39 +2254,28 @@ class WBInterface(object):
             ext: str; macro extention
             comp: str; module to open          
         """
-        
-        if ext == 'py': logext = 'Python'
-        elif ext == 'js': logext = 'JScript'
-        else: logext = ""
-        logext = logext if logext else ext
-                    
-        self.__macros_count += 1
-        tempdir = os.path.join(os.getcwd(), self._macro_def_dir)
-        if not os.path.exists(tempdir): 
-            os.makedirs(tempdir)
-            self.__macro_dir_path = tempdir
-        
-        tempfile = '{}_Script.{}'.format(self.__macros_count, ext)       
-        tempfile = os.path.join(tempdir, tempfile)
-               
-        with open(tempfile, 'w') as f:
-            self._log_('"send_act_macro()" METHOD IS A PLACEHOLDER')
-            return False              
+        try: 
+            filename = self._macro_file(code, ext)
+        except Exception as err_msg:
+            self._log_('Failed to write macro file!')
+            self._log_(err_msg, 1) 
+            return False
                
-        self.send_act_macfile(sys, tempfile, comp, ignore_js_err=False)
-        
-        return True
+        return self.send_act_macfile(sys, filename, comp, ignore_js_err=False)
         
     # --------------------------------------------------------------------     
-    def send_act_macfile(self, mech_sys, filename, mech_comp='Model', ignore_js_err=False): 
+    def send_act_macfile(self, mech_sys, filename, mech_comp='Model', ignore_js_err=False, in_place=False): 
         """
         Executes a macro file using Mechanical in-build macro executor
+        The file is run from _macro_def_dir under its content hash (see send_act_macro()),
+        use in_place=True for macros which depend on their location
         
         Arg:
             mech_sys: str; specify a Mechanical system, e.g. 'SYS'
             filename: str; macro file
             mech_comp: str; module to open
             ignore_js_err: bool; wraps js main cammands in a try block
+            in_place: bool; run the file where it is
         """
         try:
             ext = os.path.basename(filename).split('.')[1]
@@ -1887,6 +2283,15 @@ class WBInterface(object):
             self._log_('Error: Could not determine a file extention!', 1)
             return False
         else:
+            build_start = time.time()
+            tempdir = os.path.join(os.getcwd(), self._macro_def_dir)
+            if not in_place and os.path.dirname(os.path.abspath(filename)) != tempdir:
+                try:
+                    with open(filename, 'rb') as f: filename = self._macro_file(f.read(), ext)
+                except Exception as err_msg:
+                    self._log_('Failed to write macro file!')
+                    self._log_(err_msg, 1) 
+                    return False
         
             if ext == 'py': logext = 'Python'
             elif ext == 'js': logext = 'JScript'
@@ -1905,7 +2310,7 @@ class WBInterface(object):
             else: jscode = jsfun + jsmain
             
             try:
-                self._send_js_macro(mech_sys, jscode, mech_comp, visible=True)
+                self._send_js_macro(mech_sys, jscode, mech_comp, visible=True, build_start=build_start)
             except Exception as err_msg:
                 self._log_('An error occured!')
                 self._log_(err_msg, 1) 
@@ -1973,7 +2378,7 @@ class WBInterface(object):
         """
         JS functions used to print pictures
         """
-        return self.__jsfun_edgeproc() + '''
+        return self._js_lib('edgeproc') + '''
             function saveObjectsPictures(clsidObj, activeObjs, pdir, pName, pPref, pFit, imode, pView, pWireMode){                              
                 var numObjs = activeObjs.Count;
                 var image = DS.Graphics.ImageCaptureControl;
@@ -2170,11 +2575,94 @@ class WBInterface(object):
         self._log_('Sending macros to Workbench system')
         self._send_js_macro(system, macro, comp=component, visible=gui)
         
+    # --------------------------------------------------------------------
+    @contextmanager
+    def js_transaction(self):
+        """
+        Sends all JS macros of a block to Mechanical at once
+        
+        Inside the block wrappers (set_cores_number(), save_figures(), etc.) and
+        send_js_macro() only queue their scripts. On exit scripts are grouped by 
+        (system, component): Mechanical is opened once per group, helper functions 
+        are sent once and every macro runs in its own try block, so a failing macro
+        doesn't stop the rest. Queued macros are dropped if the block raises.
+        Nested transactions join the outer one.
+        
+        Example:
+            with wb.js_transaction():
+                wb.set_cores_number('SYS', 4)
+                wb.set_unit_system('SYS', 'NMM')
+                wb.save_figures('SYS', cwdp('pictures'))
+        """
+        if self._js_queue is not None:
+            yield
+            return
+            
+        queue = self._js_queue = OrderedDict()
+        try:
+            yield
+        except:
+            self._js_queue = None
+            self._render_pending = []
+            self._log_('Transaction aborted: queued JS macros dropped', 1)
+            raise
+        self._js_queue = None
+        self._flush_js_queue(queue)
+        pending, self._render_pending = self._render_pending, []
+        for render in pending: self._render_record(render)
+        
+    # --------------------------------------------------------------------
+    @contextmanager
+    def mechanical_session(self, container, module='Model', visible=True):
+        """
+        Keeps Mechanical editor open for the whole block
+        
+        All JS macros for this system and component (wrappers, send_js_macro(),
+        js_transaction()) are sent to the open editor instead of opening and 
+        closing it every time. set_active_DP() inside the block switches the base DP
+        and refreshes the component and graphics inside the same session.
+        Editor is closed on exit, also on errors.
+        
+        Arg:
+            container: str; specify a Mechanical system, e.g. 'SYS'
+            module: str; module to open
+            visible: bool; open editor interactively, needed for pictures
+        
+        Example:
+            with wb.mechanical_session('SYS'):
+                for i, dp in enumerate(wb.DPs):
+                    wb.set_active_DP(dp)
+                    wb.save_figures('SYS', cwdp('pictures'), fpref='Result_DP{}'.format(i))
+        """
+        key = (container, module)
+        if key in self._mech_sessions:
+            yield
+            return
+        
+        if not self.__active:
+            self._log_('Cannot open Mechanical session: No active project found!', 1)
+            raise NoActiveProjectFound
+            
+        self._log_('Opening Mechanical session -> System: "{}", Component: "{}"'.format(container, module))
+        system = workbench.GetSystem(Name=container)
+        model = system.GetContainer(ComponentName=module)
+        model.Edit(Interactive=visible)
+        session = self._mech_sessions[key] = [model, visible, 0]
+        try:
+            yield
+        finally:
+            del self._mech_sessions[key]
+            try: model.Exit()
+            except Exception as err_msg:
+                self._log_('An error occured while closing Mechanical!')
+                self._log_(err_msg)
+            self._log_('Mechanical session closed: {} macros sent'.format(session[2]), 1)
+        
     # ---------------------------------------------------------------
     # Private methods
     # ---------------------------------------------------------------
     
-    def _send_js_macro(self, sys, code, comp='Model', visible=False):
+    def _send_js_macro(self, sys, code, comp='Model', visible=False, build_start=None):
         """
         Executes JS macro. This method is used for all interactions with Mechanical
         
@@ -2187,30 +2675,508 @@ class WBInterface(object):
             sys: str; specify a Mechanical system, e.g. 'SYS'
             code: str; JS macro string
             comp: str; module to open
+            build_start: float; time.time() when the caller started to assemble code,
+                         build time in macro_timings counts from it
         """
 
         if not self.__active:
             self._log_('Cannot send js macro: No active project found!', 1)
             raise NoActiveProjectFound
         
+        if build_start is None: build_start = time.time()
+        if self._js_queue is not None:
+            self._queue_js_macro(sys, code, comp, visible, build_start)
+            self._log_('Queued Script for -> System: "{}", Component: "{}"'.format(sys, comp), 1)
+            return True
+        
         self._log_('Running Script at -> System: "{}", Component: "{}"'.format(sys, comp))
         
-        ds_space = 'WB.AppletList.Applet("DSApplet").App.'
-        code = code.replace('DS.', ds_space) 
+        code, name = self._compile_js(code)
         
-        try:                      
-            system = workbench.GetSystem(Name=sys)
-            model = system.GetContainer(ComponentName=comp)           
-            model.Edit(Interactive=visible)
-            model.SendCommand(Command=code)           
-            model.Exit()       
+        start = time.time()
+        build_time = start - build_start
+        session = self._mech_sessions.get((sys, comp))
+        try:
+            if session is not None:
+                session[2] += 1
+                session[0].SendCommand(Command=code)
+            else:
+                system = workbench.GetSystem(Name=sys)
+                model = system.GetContainer(ComponentName=comp)           
+                model.Edit(Interactive=visible)
+                model.SendCommand(Command=code)           
+                model.Exit()       
         except Exception as err_msg:
             self._log_('An error occured!')
             self._log_(err_msg, 1) 
             return False
         else:
-            self._log_('Finished', 1)
+            run_time = time.time() - start
+            self._macro_timings.append((name, build_time, run_time))
+            self._log_('Finished {}: build {:.1f} ms, run {:.1f} s'.format(name, build_time*1000, run_time), 1)
             return True
+    # --------------------------------------------------------------------
+    def _compile_js(self, code):
+        """
+        Prepares JS for SendCommand(). Macro is named after its last declared 
+        function (wrappers call it last) or its first call
+        
+        Returns:
+            compiled JS, macro name
+        """
+        match = _JS_FUNCTION.match(code, max(code.rfind('function'), 0)) or _JS_CALL.search(code)
+        name = match.group(1) if match else 'script'
+        return code.replace('DS.', self._ds_space), name
+    # --------------------------------------------------------------------
+    def _js_lib(self, name):
+        """Helper JS library ('savepics', 'setscale' or 'edgeproc'), built once"""
+        lib = self._js_libs.get(name)
+        if lib is None:
+            builders = dict(savepics=self.__jsfun_savepics, setscale=self.__jsfun_setscale, 
+                            edgeproc=self.__jsfun_edgeproc)
+            lib = self._js_libs[name] = builders[name]()
+        return lib
+    # --------------------------------------------------------------------
+    def _macro_file(self, code, ext):
+        """Writes macro to _macro_def_dir named by its hash, existing file is reused"""
+        tempdir = os.path.join(os.getcwd(), self._macro_def_dir)
+        if not os.path.exists(tempdir): os.makedirs(tempdir)
+        
+        filename = os.path.join(tempdir, '{}.{}'.format(self._digest(code)[:20], ext))
+        if os.path.isfile(filename):
+            os.utime(filename, None)
+            self._log_('Reusing macro file: {}'.format(os.path.basename(filename)))
+        else:
+            tmp = '{}.{}.tmp'.format(filename, os.getpid())
+            with open(tmp, 'wb') as f: 
+                f.write(code.encode('utf-8') if not isinstance(code, bytes) else code)
+            if os.path.isfile(filename): os.remove(tmp)
+            else: os.rename(tmp, filename)
+            self._evict_macro_files()
+        return filename
+    # --------------------------------------------------------------------
+    def _evict_macro_files(self):
+        """Keeps _macro_dir_files most recently used files in _macro_def_dir"""
+        tempdir = os.path.join(os.getcwd(), self._macro_def_dir)
+        if not os.path.isdir(tempdir): return
+        files = [os.path.join(tempdir, f) for f in os.listdir(tempdir)]
+        files = sorted((f for f in files if os.path.isfile(f)), key=os.path.getmtime)
+        for f in files[:max(0, len(files) - self._macro_dir_files)]:
+            try: os.remove(f)
+            except OSError: pass
+    # --------------------------------------------------------------------
+    def _render_check(self, wrapper, container, module, fpath, prefix, args):
+        """
+        Decides if a picture export can be skipped (render_manifest=True)
+        
+        Inputs of an export are hashed: wrapper and its view arguments, parameter values
+        of the active DP and size/mtime of result files of the system for the active DP.
+        Manifest '_render_manifest.json' in fpath keeps this hash and files written
+        by the export; export is skipped if the hash is the same and all files exist.
+        Exports which wrote no files are not recorded.
+        
+        Returns:
+            bool: skip, render record for _render_record()
+        """
+        if not self._render_manifest: return False, None
+        
+        key = '{}|{}|{}|{}'.format(wrapper, container, module, prefix)
+        inputs = [key, [str(a) for a in args], self._dp_parameter_values(), self._result_files_state(container)]
+        digest = self._digest(json.dumps(inputs, sort_keys=True))
+        
+        entry = self._load_render_manifest(fpath).get(key)
+        if (entry and entry['hash'] == digest and entry['files'] and 
+                all(os.path.isfile(os.path.join(fpath, f)) for f in entry['files'])):
+            self._renders[1] += 1
+            self._log_('Unchanged since last export, skipped ({} files)'.format(len(entry['files'])), 1)
+            return True, None
+        
+        return False, dict(fpath=fpath, key=key, hash=digest, prefix=prefix, start=time.time())
+    # --------------------------------------------------------------------
+    def _render_record(self, render):
+        """Writes files of a finished export into the manifest, counts it as rendered if it wrote files"""
+        if render is None: return
+        if self._js_queue is not None:
+            self._render_pending.append(render)
+            return
+        
+        fpath, prefix = render['fpath'], render['prefix']
+        try:
+            files = [f for f in os.listdir(fpath) if f.startswith(prefix) and 
+                     os.path.getmtime(os.path.join(fpath, f)) >= render['start'] - 2]
+            manifest = self._load_render_manifest(fpath)
+            if files: 
+                self._renders[0] += 1
+                manifest[render['key']] = dict(hash=render['hash'], files=sorted(files))
+            elif manifest.pop(render['key'], None) is None: return
+            with open(os.path.join(fpath, self._render_manifest_file), 'w') as f: 
+                json.dump(manifest, f, indent=1, sort_keys=True)
+        except Exception as err_msg:
+            self._log_('Failed to update render manifest!')
+            self._log_(err_msg, 1)
+    # --------------------------------------------------------------------
+    def _load_render_manifest(self, fpath):
+        """Manifest of pictures in a directory, empty if missing or broken"""
+        try:
+            with open(os.path.join(fpath, self._render_manifest_file)) as f: return json.load(f)
+        except (IOError, OSError, ValueError): 
+            return {}
+    # --------------------------------------------------------------------
+    def _dp_parameter_values(self):
+        """Parameter values of the active DP, empty if not available"""
+        try:
+            dp = self._active_dp if self._active_dp is not None else workbench.Parameters.GetBaseDesignPoint()
+            return sorted('{}={}'.format(p.Name, dp.GetParameterValue(p).Value) 
+                          for p in workbench.Parameters.GetAllParameters())
+        except: 
+            return []
+    # --------------------------------------------------------------------
+    def _result_files_state(self, container):
+        """Size and mtime of result files of a system in dp0 and in the folder of the active DP"""
+        if not self.__workfile: return []
+        files_dir = os.path.splitext(os.path.abspath(self.__workfile))[0] + '_files'
+        folders = ['dp0']
+        try:
+            if self._active_dp is not None and 'dp' + self._active_dp.Name not in folders:
+                folders.append('dp' + self._active_dp.Name)
+        except: pass
+        state = []
+        for folder in folders:
+            for f in sorted(glob(os.path.join(files_dir, folder, container, '*', '*.r??'))):
+                try: state.append([folder, os.path.basename(f), os.path.getsize(f), int(os.path.getmtime(f))])
+                except OSError: pass
+        return state
+    # --------------------------------------------------------------------
+    def _refresh_session(self, sys, comp, session):
+        """Refreshes component of an open editor after the base DP was changed"""
+        model, visible, _ = session
+        try:
+            workbench.GetSystem(Name=sys).GetComponent(Name=comp).Refresh()
+            # Only brings editor to front if it's still open
+            model.Edit(Interactive=visible)
+            model.SendCommand(Command=self._ds_space + 'Graphics.Redraw(1);')
+        except Exception as err_msg:
+            self._log_('Failed to refresh Mechanical session -> System: "{}", Component: "{}"'.format(sys, comp))
+            self._log_(err_msg, 1)
+    # --------------------------------------------------------------------
+    def _queue_js_macro(self, sys, code, comp, visible, build_start):
+        """
+        Adds JS macro to the transaction queue
+        Functions with the same name are kept once; a function redefined with 
+        another body starts a new script, as JS would use only the last definition.
+        Build times of queued macros add up to the build time of their script
+        """
+        functions, main = self._split_js(code)
+        batches = self._js_queue.setdefault((sys, comp), [])
+        
+        same = lambda a, b: a.split() == b.split()
+        batch = batches[-1] if batches else None
+        if batch is None or any(not same(batch['functions'].get(name, src), src) for name, src in functions):
+            batch = dict(functions=OrderedDict(), steps=[], visible=False, build=0.0)
+            batches.append(batch)
+            
+        for name, src in functions: batch['functions'].setdefault(name, src)
+        if main.strip(): batch['steps'].append(main)
+        batch['visible'] = batch['visible'] or visible
+        batch['build'] += time.time() - build_start
+    # --------------------------------------------------------------------
+    def _flush_js_queue(self, queue):
+        """Sends queued JS macros, one script per (system, component)"""
+        res = True
+        for (sys, comp), batches in queue.items():
+            for batch in batches:
+                if not batch['steps']: continue
+                self._log_('Transaction: {} macros, {} functions'.format(len(batch['steps']), len(batch['functions'])))
+                build_start = time.time() - batch['build']
+                code = ''.join(batch['functions'].values())
+                code += ''.join(self._try_wrapper_js(step) for step in batch['steps'])
+                res = self._send_js_macro(sys, code, comp, visible=batch['visible'], build_start=build_start) and res
+        return res
+    # --------------------------------------------------------------------
+    def _disk_monitor(self):
+        """DiskUsageMonitor for the opened project"""
+        files_dir = os.path.splitext(os.path.abspath(self.__workfile))[0] + '_files'
+        scratch = [os.path.join(os.getcwd(), '_ProjectScratch'), os.path.join(files_dir, '_ProjectScratch')]
+        guard = self._disk_guard
+        return DiskUsageMonitor(guard['outfile'], files_dir, scratch, min_free=guard['min_free'],
+                                timer=guard['timer'], logger=self._logger)
+    # --------------------------------------------------------------------
+    def _update_DPs(self, dps, args, monitor, times):
+        """Updates DPs in one call, or one by one if there's a disk guard action; returns DPs not updated"""
+        args['DesignPoints'] = dps
+        if monitor and self._disk_guard['action']: return self._update_guarded(args, monitor, times)
+        workbench.UpdateAllDesignPoints(**args)
+        return []
+    # --------------------------------------------------------------------
+    def _get_cores_number(self, container, module='Model'):
+        """Number of cores set in Mechanical, None if it can't be read"""
+        if self._js_queue is not None: return None
+        filename = os.path.join(os.getcwd(), '_cores_number.txt')
+        jscode = '''
+             function getNumberOfCores(filename)
+             {
+                    var jobHandlerManager = DS.Script.getJobHandlerManager();
+                    var defaultHandler = DS.Script.getDefaultHandler(jobHandlerManager);
+                    var fso = new ActiveXObject("Scripting.FileSystemObject");
+                    var f = fso.CreateTextFile(filename, true);
+                    f.WriteLine(defaultHandler.MaxNumberProcessors);
+                    f.Close();
+             }
+        ''' + 'getNumberOfCores("{}");'.format(filename.replace('\\', '\\\\'))
+        try:
+            if not self._send_js_macro(container, jscode, module): return None
+            with open(filename) as f: return int(f.read().strip())
+        except Exception:
+            return None
+        finally:
+            if os.path.isfile(filename): os.remove(filename)
+    # --------------------------------------------------------------------
+    def _retry_failed(self, args, monitor, times, skipped):
+        """
+        Updates failed DPs again up to set_retry() attempts
+        Returns per-DP status table with attempts and DPs not updated
+        """
+        retry = self._retry
+        stop = 'Stop' in (args['ErrorBehavior'], args['CannotCompleteBehavior'])
+        messages = self._get_messages()
+        status = self._collect_dp_status(messages, times, skipped, True, stop=stop)
+        # Number of cores is a global Mechanical setting, it's restored after retries
+        original_cores = self._get_cores_number(retry['container']) if retry['cores'] else None
+        cores_changed = False
+        try:
+            for attempt in range(2, retry['attempts'] + 1):
+                failed = [dp for dp, row in zip(self.__DPs, status) if row['state'] == 'failed']
+                if not failed: break
+                self._log_('Attempt {} of {}: updating {} failed DPs again...'.format(attempt, retry['attempts'], len(failed)))
+                # Messages are cleared before the retry, they stay in the log and in attempts of dp_status
+                for msg_type, summary in messages: self._log_(msg_type + ": " + summary)
+                self._logger.blank()
+                
+                cores = retry['cores'][min(attempt - 2, len(retry['cores']) - 1)] if retry['cores'] else None
+                if cores is not None: 
+                    self.set_cores_number(retry['container'], value=cores)
+                    cores_changed = True
+                if retry['callback']: retry['callback'](self, attempt, failed)
+                
+                workbench.ClearMessages()
+                for dp in failed: times.pop(dp.Name, None)
+                skipped = self._update_DPs(failed, args, monitor, times)
+                
+                messages = self._get_messages()
+                new = self._collect_dp_status(messages, times, skipped, True, failed, stop)
+                for row in new:
+                    row['attempts'] = status[row['dp']]['attempts'] + [OrderedDict(row['attempts'][0], attempt=attempt, cores=cores)]
+                    status[row['dp']] = row
+        finally:
+            if cores_changed:
+                if original_cores is not None: self.set_cores_number(retry['container'], value=original_cores)
+                else: self._log_('Number of cores before retries is unknown, it was not restored!', 1)
+        return status, skipped
+    # --------------------------------------------------------------------
+    def _update_guarded(self, args, monitor, times):
+        """
+        Updates DPs one by one, applies disk guard action before every DP if space is low
+        Returns list of DPs which were not updated, times gets update time of every DP name
+        """
+        action = self._disk_guard['action']
+        dps = list(args['DesignPoints'])
+        for num, dp in enumerate(dps):
+            if num: monitor.sample()
+            if monitor.low_space:
+                self._log_('Low disk space before DP{}: {:.0f} MB free'.format(dp.Name, monitor.free_mb))
+                if action == 'prune':
+                    self.prune_results(dps[:num])
+                    monitor.sample()
+                elif action == 'pause':
+                    self._log_('Update paused until there is enough space...')
+                    start = time.time()
+                    while monitor.low_space and time.time() - start < self._disk_guard['max_pause']: 
+                        time.sleep(self._disk_guard['timer'])
+                    if not monitor.low_space: self._log_('Update resumed', 1)
+                    else: self._log_('No space freed in {:.0f} s'.format(time.time() - start))
+                if monitor.low_space:
+                    self._log_('Update stopped: {} of {} DPs are not updated'.format(len(dps) - num, len(dps)), 1)
+                    return dps[num:]
+            args['DesignPoints'] = [dp]
+            start = time.time()
+            try: workbench.UpdateAllDesignPoints(**args)
+            finally: times[dp.Name] = time.time() - start
+        return []
+    # --------------------------------------------------------------------
+    def _dp_states(self):
+        """
+        DP name --> state from the last status table (see dp_status), DP.IsUpToDate for other DPs;
+        only the status table knows failed DPs, others are 'up-to-date' or 'not updated'
+        """
+        states = dict((row['name'], row['state']) for row in self._dp_status)
+        for dp in self.__DPs:
+            if dp.Name in states: continue
+            try: states[dp.Name] = 'up-to-date' if dp.IsUpToDate else 'not updated'
+            except: states[dp.Name] = 'unknown'
+        return states
+    # --------------------------------------------------------------------
+    def _get_messages(self):
+        """Workbench messages as list of (type, summary)"""
+        res = []
+        try:
+            for msg in workbench.GetMessages():
+                try: res.append((str(msg.MessageType), str(msg.Summary)))
+                except: pass
+        except: pass
+        return res
+    # --------------------------------------------------------------------
+    def _collect_dp_status(self, messages, times, skipped, completed, dps=None, stop=False):
+        """
+        Per-DP status table from messages (parsed for DP numbers) and update times
+        Inputs are taken from imported parameters, DP states are read once per DP
+        
+        Args:
+            completed: bool, update finished without exception; DPs without errors are 
+                       up-to-date then if every error message names its DP
+            dps: list, only these DPs, defaults to all
+            stop: bool, update stops on the first failed DP; DPs after it which are 
+                  not up-to-date and have no errors were not reached ('not updated')
+        """
+        dp_messages = defaultdict(list)
+        failed = set()
+        unattributed = 0
+        for msg_type, summary in messages:
+            names = set(_DP_MESSAGE.findall(summary))
+            error = msg_type.lower().startswith('error')
+            for name in names:
+                dp_messages[name].append('{}: {}'.format(msg_type, summary))
+                if error: failed.add(name)
+            if error and not names: unattributed += 1
+        up_to_date = completed and not unattributed
+        
+        skipped = set(dp.Name for dp in skipped)
+        pars = [p for p in self._param_in if p in self._param_in_value] or list(self._param_in_value)
+        res = []
+        stopped = False
+        for num, dp in enumerate(self.__DPs):
+            if dps is not None and dp not in dps: continue
+            name = str(dp.Name)
+            try: dp_up_to_date = bool(dp.IsUpToDate)
+            except: dp_up_to_date = None
+            
+            if name in skipped: state = 'skipped'
+            elif name in failed: state = 'failed'
+            elif dp_up_to_date is False: state = 'not updated' if stopped else 'failed'
+            elif dp_up_to_date or up_to_date: state = 'up-to-date'
+            else: state = 'unknown'
+            if stop and state == 'failed': stopped = True
+            
+            inputs = OrderedDict()
+            for par in pars:
+                values = self._param_in_value[par]
+                if num < len(values): inputs[par] = self._value_str(values[num])
+            attempt = OrderedDict([('attempt', 1), ('state', state), ('elapsed', times.get(name)), ('cores', None), 
+                                   ('messages', dp_messages.get(name, []))])
+            res.append(OrderedDict([('dp', num), ('name', name), ('state', state), ('elapsed', times.get(name)), 
+                                    ('inputs', inputs), ('messages', dp_messages.get(name, [])), ('attempts', [attempt])]))
+        
+        counts = defaultdict(int)
+        for row in res: counts[row['state']] += 1
+        self._log_('DP status: {}'.format(', '.join('{} {}'.format(v, k) for k, v in sorted(counts.items()))), 1)
+        return res
+    # --------------------------------------------------------------------
+    def _external_files(self):
+        """Files of the project outside of its directory, None if they can't be listed"""
+        try: files = [f.Location for f in workbench.GetAllFiles()]
+        except: return None
+        root = os.path.dirname(os.path.abspath(self.__workfile))
+        return [f for f in files if not os.path.abspath(f).startswith(root + os.sep)]
+    # --------------------------------------------------------------------
+    def _open_cached_archive(self, wbpz_file, cache, link):
+        """Opens project of an archive from cache, False if archive is not cached"""
+        index = self._load_archive_cache(cache)
+        key = self._archive_hash(wbpz_file, index)
+        entry = index[os.path.abspath(wbpz_file)]
+        self._save_archive_cache(cache, index)
+        
+        project = os.path.abspath(self.__workfile)
+        clean = os.path.join(os.path.abspath(cache), key[:20])
+        clean_project = glob(os.path.join(clean, '*.wbpj'))
+        
+        if entry.get('project') == [project, self._project_state(project)]:
+            self._log_('Project is unchanged since unpacking, opening it in place...')
+        elif clean_project:
+            self._log_('Restoring project from cache: {}'.format(clean))
+            start = time.time()
+            files_dir = os.path.splitext(project)[0] + '_files'
+            if os.path.isdir(files_dir): shutil.rmtree(files_dir)
+            if os.path.isfile(project): os.remove(project)
+            self._clone_tree(clean_project[0], project, link)
+            self._clone_tree(os.path.splitext(clean_project[0])[0] + '_files', files_dir, link)
+            self._log_('Restored in {:.1f} s'.format(time.time() - start), 1)
+        else:
+            return False
+            
+        workbench.Open(FilePath=self.__workfile)
+        if os.path.isdir(clean): os.utime(clean, None)
+        self._record_archive_project(wbpz_file, cache)
+        return True
+    # --------------------------------------------------------------------
+    def _cache_archive(self, wbpz_file, cache):
+        """Keeps a clean copy of just unpacked project in cache"""
+        try:
+            index = self._load_archive_cache(cache)
+            key = self._archive_hash(wbpz_file, index)
+            clean = os.path.join(os.path.abspath(cache), key[:20])
+            if not os.path.isdir(clean):
+                self._log_('Copying unpacked project to cache...')
+                # Copy is complete only when renamed, broken copies are never used
+                tmp = clean + '.tmp'
+                if os.path.isdir(tmp): shutil.rmtree(tmp)
+                project = os.path.abspath(self.__workfile)
+                self._clone_tree(project, os.path.join(tmp, os.path.basename(project)))
+                files_dir = os.path.splitext(project)[0] + '_files'
+                if os.path.isdir(files_dir): 
+                    self._clone_tree(files_dir, os.path.join(tmp, os.path.basename(files_dir)))
+                os.rename(tmp, clean)
+            self._save_archive_cache(cache, index)
+            self._record_archive_project(wbpz_file, cache)
+            self._evict_archive_cache(cache)
+        except Exception as err_msg:
+            self._log_('Failed to cache unpacked project!')
+            self._log_(err_msg, 1)
+    # --------------------------------------------------------------------
+    def _record_archive_project(self, wbpz_file, cache):
+        """Remembers state of the project opened from archive to open it in place next time"""
+        project = os.path.abspath(self.__workfile)
+        index = self._load_archive_cache(cache)
+        index[os.path.abspath(wbpz_file)]['project'] = [project, self._project_state(project)]
+        self._save_archive_cache(cache, index)
+    # --------------------------------------------------------------------
+    def _archive_hash(self, wbpz_file, index):
+        """sha1 of archive, taken from index if archive size and mtime didn't change"""
+        path = os.path.abspath(wbpz_file)
+        stat = [os.path.getsize(path), int(os.path.getmtime(path))]
+        entry = index.get(path)
+        if entry and entry.get('stat') == stat: return entry['hash']
+        
+        self._log_('Hashing archive...')
+        index[path] = dict(stat=stat, hash=self._file_hash(path))
+        return index[path]['hash']
+    # --------------------------------------------------------------------
+    def _load_archive_cache(self, cache):
+        """Index of cached archives, empty if missing or broken"""
+        try:
+            with open(os.path.join(cache, self._archive_cache_index)) as f: return json.load(f)
+        except (IOError, OSError, ValueError): 
+            return {}
+    # --------------------------------------------------------------------
+    def _save_archive_cache(self, cache, index):
+        if not os.path.isdir(cache): os.makedirs(cache)
+        with open(os.path.join(cache, self._archive_cache_index), 'w') as f: json.dump(index, f, indent=1)
+    # --------------------------------------------------------------------
+    def _evict_archive_cache(self, cache):
+        """Keeps _archive_cache_max most recently used clean copies"""
+        dirs = [os.path.join(cache, d) for d in os.listdir(cache)]
+        dirs = sorted((d for d in dirs if os.path.isdir(d)), key=os.path.getmtime)
+        for d in dirs[:max(0, len(dirs) - self._archive_cache_max)]:
+            self._log_('Removing cached project: {}'.format(d))
+            shutil.rmtree(d, ignore_errors=True)
     # --------------------------------------------------------------------    
     def _scale_eval(self, value):
         strwrap = lambda x: '"{}"'.format(x)
@@ -2262,10 +3228,21 @@ class WBInterface(object):
         self.__DPs = self._get_DPs()
         self.__DPs_present = len(self.__DPs)
     # --------------------------------------------------------------------     
+    def _read_control_rows(self, rows, csv_skip):
+        """Reads parameter names from control file rows"""
+        for i, row in enumerate(rows):
+            for rlin in row:
+                skip = rlin.lower().find(csv_skip)
+                if i == 0 and skip == -1:
+                    self._param_in.append(self._safeguard(rlin))
+                elif i == 1 and skip == -1:
+                    self._param_out.append(self._safeguard(rlin))
+    # --------------------------------------------------------------------     
     def _input_list_by_name(self, inp):
         """Read parameters from list"""
         self._log_('Reading input parameters values from list...')
         self._param_in_value = defaultdict(list)
+        self._input_table = None
         self.__DPs_imported = 0
         inp_str = [map(str, t) for t in inp]
         try:
@@ -2282,6 +3259,7 @@ class WBInterface(object):
         """Read parameters from dict"""
         self._log_('Reading input parameters table...')
         self._param_in_value = defaultdict(list)
+        self._input_table = None
         self._param_in = []
         self.__DPs_imported = 0
         try:
@@ -2294,6 +3272,24 @@ class WBInterface(object):
             self._log_(err_msg, 1)
             raise
         self.__DPs_imported = len(self._param_in_value[self._safeguard(key)])
+    # --------------------------------------------------------------------     
+    def _input_table_by_name(self, table):
+        """Read parameters from CSVTable.Table, named columns are stored as is"""
+        self._log_('Reading input parameters from table...')
+        names = table.names
+        if all(isinstance(name, int) for name in names):
+            if not self._param_in:
+                self._log_('No parameter keys found!')
+                raise KeysNotFound
+            names = self._param_in
+        
+        self._param_in_value = defaultdict(list)
+        self._input_table = table
+        self._param_in = []
+        for key, column in zip(names, table.columns):
+            self._param_in.append(self._safeguard(key))
+            self._param_in_value[self._safeguard(key)] = column
+        self.__DPs_imported = len(table)
     # -------------------------------------------------------------------- 
     def _output_group_by_DPs(self):
         """Returns output parameters as list grouped by Design Points"""
@@ -2303,6 +3299,27 @@ class WBInterface(object):
                 res[i][j] = self._param_out_value[key][i]
         return res
     # -------------------------------------------------------------------- 
+    def _output_xlsx(self, output_file_name, append=False):
+        """Streams output parameters to a new sheet of .xlsx file"""
+        if XlsxFileWriter is None:
+            self._log_('Cannot output to {}: XlsxFile module not found!'.format(output_file_name), 1)
+            return None
+            
+        self._log_('Outputing parameters to {}...'.format(output_file_name))
+        sheet = datetime.now().strftime('Run %Y-%m-%d %H.%M.%S')
+        try:
+            with XlsxFileWriter(output_file_name, append=append) as xlsx:
+                xlsx.add_sheet(sheet, header=self._param_out)
+                for dp in self.__DPs:
+                    xlsx.write_row([self._get_parameter_value(dp, key) for key in self._param_out])
+        except Exception as err_msg:
+            self._log_('An error occured while outputting parameters!')
+            self._log_(err_msg, 1)  
+            return None
+        else:
+            self._log_('Output successful: {} rows in sheet {}'.format(xlsx.rows_written, ', '.join(xlsx.sheet_names[-1:])), 1)
+            return xlsx.rows_written
+    # -------------------------------------------------------------------- 
     def _save_project(self):
         workbench.Save(Overwrite=True)
         self._log_('Project Saved', 1)
@@ -2381,48 +3398,43 @@ class WBInterface(object):
         return dict(zip(keys, values))	
     
     @staticmethod
-    def copy_files(template, source_dir, target_dir):
+    def copy_files(template, source_dir, target_dir, threads=4, link=False, verify=False, skip_identical=True, log=None):
         """
         Copy files
+        Files are copied by a pool of threads together with their modification time,
+        files identical to the ones in target dir (size, mtime and hash) are skipped
         
         Args:
             template: str, search files with this pattern
             source_dir: str, source dir
             target_dir: str, target dir
-        """
-        srch_template = os.path.join(source_dir, template)
-        try:
-            srch = [f for f in glob(srch_template)]
-            f = srch[0]
-        except:
-            pass
-        else:
-            if not os.path.exists(target_dir): os.makedirs(target_dir)
-            for f in srch:
-                filename = os.path.basename(f)
-                shutil.copyfile(f, os.path.join(target_dir, filename))
+            threads: int, copying threads
+            link: bool, hard link files instead of copying where possible (same volume);
+                  linked files share content, so don't use it for files modified in place
+            verify: bool, compare hashes of source and copied files
+            skip_identical: bool, skip files identical at target
+            log: callable, logs totals and throughput
+        Returns:
+            dict, 'files', 'copied', 'linked', 'moved', 'skipped', 'bytes' (copied), 'time' (s)
+        """
+        files = glob(os.path.join(source_dir, template))
+        return WBInterface._transfer_files(files, target_dir, False, threads, link, verify, skip_identical, log)
                 
     @staticmethod            
-    def move_files(template, source_dir, target_dir):
+    def move_files(template, source_dir, target_dir, threads=4, verify=False, skip_identical=True, log=None):
         """
         Move files
+        Files are renamed if possible (same volume), copied by a pool of threads 
+        and deleted otherwise; see copy_files()
         
         Args:
             template: str, search files with this pattern
             source_dir: str, source dir
             target_dir: str, target dir
+            others: see copy_files()
         """
-        srch_template = os.path.join(source_dir, template)
-        try:
-            srch = [f for f in glob(srch_template)]
-            f = srch[0]
-        except:
-            pass
-        else:
-            if not os.path.exists(target_dir): os.makedirs(target_dir)
-            for f in srch:
-                filename = os.path.basename(f)
-                os.rename(f, os.path.join(target_dir, filename))
+        files = glob(os.path.join(source_dir, template))
+        return WBInterface._transfer_files(files, target_dir, True, threads, False, verify, skip_identical, log)
                 
     @staticmethod            
     def delete_files(template, source_dir):
@@ -2442,6 +3454,179 @@ class WBInterface(object):
         else:
             for f in srch: os.remove(f)
     
+    @staticmethod
+    def _clone_tree(src, dst, link=False):
+        """
+        Copies file or directory without _ProjectScratch and lock files
+        Files are hard linked if link and links are supported, copied otherwise
+        """
+        def clone(s, d):
+            if link:
+                try: return os.link(s, d)
+                except (OSError, AttributeError, NotImplementedError): pass
+            shutil.copy2(s, d)
+            
+        if os.path.isfile(src):
+            if not os.path.isdir(os.path.dirname(dst)): os.makedirs(os.path.dirname(dst))
+            return clone(src, dst)
+        for root, dirs, files in os.walk(src):
+            dirs[:] = [d for d in dirs if d != '_ProjectScratch']
+            target = os.path.join(dst, os.path.relpath(root, src))
+            if not os.path.isdir(target): os.makedirs(target)
+            for f in files:
+                if not f.endswith('.lock'): clone(os.path.join(root, f), os.path.join(target, f))
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _project_state(project):
+        """Number of files, total size and newest mtime of project file and its _files directory"""
+        files = [project]
+        for root, dirs, names in os.walk(os.path.splitext(project)[0] + '_files'):
+            dirs[:] = [d for d in dirs if d != '_ProjectScratch']
+            files.extend(os.path.join(root, f) for f in names if not f.endswith('.lock'))
+        try: 
+            return [len(files), sum(os.path.getsize(f) for f in files), max(int(os.path.getmtime(f)) for f in files)]
+        except OSError: 
+            return None
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _transfer_files(files, target_dir, move, threads, link, verify, skip_identical, log):
+        """Copies or moves files to target_dir with a pool of threads, see copy_files()"""
+        files = [f for f in files if os.path.isfile(f)]
+        res = dict(files=len(files), copied=0, linked=0, moved=0, skipped=0, bytes=0, time=0)
+        if not files: return res
+        if not os.path.exists(target_dir): os.makedirs(target_dir)
+        
+        start = time.time()
+        lock = threading.Lock()
+        def transfer(src):
+            dst = os.path.join(target_dir, os.path.basename(src))
+            if WBInterface._same_path(src, dst):
+                # Source is its own target, nothing to do
+                with lock: res['skipped'] += 1
+                return
+            size = os.path.getsize(src)
+            if skip_identical and WBInterface._same_file(src, dst): how = 'skipped'
+            elif move and WBInterface._rename(src, dst): how = 'moved'
+            elif link and not move and WBInterface._hard_link(src, dst): how = 'linked'
+            else:
+                # Target may be a hard link, it's replaced instead of overwritten
+                if os.path.exists(dst): os.remove(dst)
+                shutil.copy2(src, dst)
+                if verify and WBInterface._file_hash(src) != WBInterface._file_hash(dst):
+                    shutil.copy2(src, dst)
+                    if WBInterface._file_hash(src) != WBInterface._file_hash(dst): 
+                        raise IOError('Copy verification failed: {}'.format(dst))
+                how = 'copied'
+            if move and how != 'moved':
+                # Source goes only if target is a separate file with its content
+                if WBInterface._same_path(src, dst) or os.path.getsize(dst) != size:
+                    raise IOError('Cannot move {}: target check failed'.format(src))
+                os.remove(src)
+            with lock:
+                res[how] += 1
+                if how == 'copied': res['bytes'] += size
+        
+        tasks, errors = Queue(), []
+        for f in files: tasks.put(f)
+        def worker():
+            while True:
+                try: src = tasks.get_nowait()
+                except Exception: return
+                try: transfer(src)
+                except Exception as err: errors.append(err)
+                
+        pool = [threading.Thread(target=worker) for _ in range(max(1, min(threads, len(files))))]
+        for t in pool: t.start()
+        for t in pool: t.join()
+        
+        res['time'] = time.time() - start
+        if log:
+            mb = res['bytes'] / 1024.0**2
+            log('{} {} files to {}: {} copied, {} linked, {} moved, {} skipped; {:.1f} MB in {:.1f} s ({:.1f} MB/s)'.format(
+                'Moved' if move else 'Copied', len(files), target_dir, res['copied'], res['linked'], res['moved'],
+                res['skipped'], mb, res['time'], mb / max(res['time'], 1e-3)))
+        if errors: raise errors[0]
+        return res
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _same_file(src, dst):
+        """True if dst has the same size, mtime and content as src"""
+        try:
+            if os.path.getsize(src) != os.path.getsize(dst): return False
+            if int(os.path.getmtime(src)) != int(os.path.getmtime(dst)): return False
+        except OSError:
+            return False
+        return WBInterface._file_hash(src) == WBInterface._file_hash(dst)
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _same_path(src, dst):
+        """True if src and dst are the same file: same path or hard links to one file"""
+        if os.path.normcase(os.path.abspath(src)) == os.path.normcase(os.path.abspath(dst)): return True
+        try: return os.path.exists(dst) and os.path.samefile(src, dst)
+        except (OSError, AttributeError): return False
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _rename(src, dst):
+        """Moves file by renaming, False if it's not possible (e.g. another volume)"""
+        try:
+            if os.path.exists(dst): os.remove(dst)
+            os.rename(src, dst)
+            return True
+        except OSError:
+            return False
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _hard_link(src, dst):
+        """Replaces dst with a hard link to src, False if links are not supported here"""
+        tmp = dst + '.link'
+        try:
+            os.link(src, tmp)
+        except (OSError, AttributeError, NotImplementedError):
+            return False
+        if os.path.exists(dst): os.remove(dst)
+        os.rename(tmp, dst)
+        return True
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _file_hash(filename):
+        """sha1 of file content"""
+        sha = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1024*1024), b''): sha.update(block)
+        return sha.hexdigest()
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _dir_size(path):
+        """Total size of files in a directory"""
+        size = 0
+        for root, _, files in os.walk(path):
+            for f in files:
+                try: size += os.path.getsize(os.path.join(root, f))
+                except OSError: pass
+        return size
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _iter_rows(inp):
+        """Yields rows from list/iterable of rows or of batches of rows"""
+        for item in inp:
+            if item and isinstance(item[0], (list, tuple)):
+                for row in item: yield row
+            else:
+                yield item
+    
+    @staticmethod
+    def _value_str(value):
+        """Converts input value to Workbench expression string"""
+        if isinstance(value, float): 
+            if value.is_integer() and abs(value) < 1e15: return str(int(value))
+            return repr(value)
+        return str(value).strip()
+    
+    @staticmethod
+    def _is_table(inp):
+        """Checks if input is a columnar CSVTable.Table"""
+        return hasattr(inp, 'names') and hasattr(inp, 'columns')
+    
     @staticmethod
     def _listify(inp):	
         """Returns list of 1 item if input is not a list"""
@@ -2472,6 +3657,57 @@ class WBInterface(object):
         ''' % code
     # ---------------------------------------------------------------
     @staticmethod
+    def _split_js(code):
+        """
+        Splits JS code into top level function declarations and the rest
+        Strings and comments are skipped while matching braces (regex literals are not)
+        
+        Returns:
+            list of (name, function source), str with other statements
+        """
+        functions, main = [], []
+        depth, start, func = 0, 0, None
+        i, n = 0, len(code)
+        while i < n:
+            ch = code[i]
+            if ch in '"\'':
+                i += 1
+                while i < n and code[i] != ch:
+                    i += 2 if code[i] == '\\' else 1
+            elif code.startswith('//', i):
+                i = code.find('\n', i)
+                if i < 0: i = n
+                continue
+            elif code.startswith('/*', i):
+                i = code.find('*/', i)
+                i = n if i < 0 else i + 1
+            elif ch == '{': 
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth == 0 and func is not None:
+                    functions.append((func[0], code[func[1]:i + 1]))
+                    start, func = i + 1, None
+            elif depth == 0 and func is None and ch == 'f':
+                match = _JS_FUNCTION.match(code, i)
+                if match and (i == 0 or not (code[i - 1].isalnum() or code[i - 1] in '_$.')):
+                    main.append(code[start:i])
+                    func, start = (match.group(1), i), i
+                    i = match.end()
+                    continue
+            i += 1
+        if func is not None:
+            raise ValueError('Unbalanced braces in JS function {}'.format(func[0]))
+        main.append(code[start:])
+        return functions, ''.join(main)
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _digest(text):
+        """sha1 of a string"""
+        if not isinstance(text, bytes): text = text.encode('utf-8')
+        return hashlib.sha1(text).hexdigest()
+    # ---------------------------------------------------------------
+    @staticmethod
     def _winpath_js(dirpath):
         """Make all back slashes into double to send into JS"""
         return os.path.join(dirpath, '').replace('\\', '\\\\')
@@ -2642,6 +3878,138 @@ class AsyncLogChecker(object):
             
 #__________________________________________________________
 
+class DiskUsageMonitor(object):
+    """
+    Uses .NET threading
+    Class used for sampling disk usage of a project: sizes of _ProjectScratch, dp* folders,
+    user_files and free space; writes them to a csv file. low_space is True while
+    free space is below min_free
+    Arg:
+        outfile: str; csv file, if empty - samples are not written
+        files_dir: str; <project>_files directory
+        scratch: list; _ProjectScratch directories
+        min_free: float; free space threshold in MB, 0 to disable
+        timer: float; sample every <timer> seconds
+        logger: Logger class
+    """
+    __version__ = '0.0.1'
+    
+    # ---------------------------------------------------------------		
+    # Public attributes
+    # ---------------------------------------------------------------
+    @property
+    def low_space(self):
+        """True if free space is below threshold"""
+        return self.__low_space
+    
+    @property
+    def free_mb(self):
+        """Free space at the last sample in MB"""
+        return self.__last[-1] if self.__last else None
+    
+    # ---------------------------------------------------------------		
+    # Magic methods
+    # ---------------------------------------------------------------
+    
+    def __init__(self, outfile, files_dir, scratch, min_free=0, timer=10, logger=None):
+        self._logger = logger if logger is not None else Logger('log.txt')
+        self._log_ = partial(self._logger.log, info=self.__class__.__name__) 
+        
+        self.outfile = outfile
+        self.files_dir = files_dir
+        self.scratch = scratch
+        self.min_free = min_free
+        self.wait = timer*1000
+        
+        self.__thread = None
+        self.__is_watching = False
+        self.__low_space = False
+        self.__last = None
+        self.__lock = threading.Lock()
+        
+        if self.outfile:
+            with open(self.outfile, 'w') as f: f.write('time,scratch_mb,dp_mb,user_files_mb,free_mb\n')
+    
+    # ---------------------------------------------------------------		
+    # Public methods
+    # ---------------------------------------------------------------
+    
+    def start(self):
+        """Start sampling"""
+        if not self.__is_watching:
+            self.__is_watching = True
+            self.sample()
+            self.__thread = Thread(ThreadStart(self.__main))
+            self._log_('Start sampling every {} sec, free space: {:.0f} MB'.format(self.wait/1000, self.free_mb), 1)
+            self.__thread.Start()
+        else:
+            self._log_('Cannot execute start command: monitor is already running!')
+    
+    def stop(self):
+        """Stop sampling"""
+        if not self.__is_watching: self._log_('Cannot execute stop command: monitor is inactive!')
+        else:
+            self.__is_watching = False
+            self.sample()
+            self._log_('Finished sampling, free space: {:.0f} MB'.format(self.free_mb), 1)
+    
+    def sample(self):
+        """
+        Takes a sample now, called by the sampling thread and update_project() alike
+        Returns:
+            list; time, sizes of scratch, dp* folders, user_files and free space in MB
+        """
+        with self.__lock: return self._sample()
+    
+    # ---------------------------------------------------------------		
+    # Private methods
+    # --------------------------------------------------------------- 
+    def _sample(self):
+        """Takes a sample, must be called while holding the lock"""
+        mb = 1024.0**2
+        dps = [os.path.join(self.files_dir, d) for d in os.listdir(self.files_dir) if d.startswith('dp')] \
+              if os.path.isdir(self.files_dir) else []
+        row = [datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+               sum(WBInterface._dir_size(d) for d in self.scratch) / mb,
+               sum(WBInterface._dir_size(d) for d in dps) / mb,
+               WBInterface._dir_size(os.path.join(self.files_dir, 'user_files')) / mb,
+               self.free_space(self.files_dir) / mb]
+        self.__last = row
+        if self.outfile:
+            with open(self.outfile, 'a') as f: f.write('{},{:.1f},{:.1f},{:.1f},{:.1f}\n'.format(*row))
+        
+        low = bool(self.min_free) and row[-1] < self.min_free
+        if low != self.__low_space:
+            if low: self._log_('Low disk space: {:.0f} MB free, threshold {} MB'.format(row[-1], self.min_free), 1)
+            else: self._log_('Disk space recovered: {:.0f} MB free'.format(row[-1]), 1)
+        self.__low_space = low
+        return row
+    # ---------------------------------------------------------------
+    def __main(self):
+        """Main execution function"""
+        while self.__is_watching:
+            Thread.Sleep(self.wait)
+            if not self.__is_watching: break
+            try: self.sample()
+            except: pass
+    # ---------------------------------------------------------------
+    
+    @staticmethod
+    def free_space(path):
+        """Free space in bytes on the drive of a path"""
+        path = os.path.abspath(path)
+        while not os.path.exists(path) and os.path.dirname(path) != path: path = os.path.dirname(path)
+        try:
+            from System.IO import DriveInfo, Path
+            return DriveInfo(Path.GetPathRoot(path)).AvailableFreeSpace
+        except ImportError: pass
+        try: return shutil.disk_usage(path).free
+        except AttributeError:
+            st = os.statvfs(path)
+            return st.f_bavail * st.f_frsize
+            
+#__________________________________________________________
+
 class NoActiveProjectFound(Exception):
     def __init__(self):
         pass
@@ -0,0 +1,769 @@
+# -*- coding: utf-8 -*-
+""" Script by Toybich Egor
+Reads and writes .xlsx files directly (zip + xml), no Excel or COM needed
+"""
+from __future__ import print_function
+import os
+import re
+import math
+import shutil
+import zipfile
+import tempfile
+import posixpath
+
+from datetime import datetime
+from xml.sax.saxutils import escape as xml_escape
+
+try: import multiprocessing
+except ImportError: multiprocessing = None
+
+try: import xml.etree.cElementTree as ElementTree
+except ImportError: import xml.etree.ElementTree as ElementTree
+
+__version__ = '1.2.0'
+
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_CELL_RE = re.compile(r'^\$?([A-Za-z]+)\$?(\d+)$')
+_ERRORS = {'#NULL!': -2146826288, '#DIV/0!': -2146826281, '#VALUE!': -2146826273, '#REF!': -2146826265,
+		   '#NAME?': -2146826259, '#NUM!': -2146826252, '#N/A': -2146826246}
+
+class XlsxFileReader(object):
+	"""Native .xlsx reader with the same methods as ExcelFileReader
+	Methods (Excel numbers elements from 1, not 0!):
+
+		activesheet_set(num:int) :change active sheet number (sheet name is also accepted)
+		g_xlr2list(cell1:str, cell2:str) --> list :gets range to list
+		g_xlr2dict(cell1:str, cell2:str, d_column=1:int) --> dict :gets range to dict with d_column as keys
+		g_active_xlr2list() --> list :gets used range to list
+		g_active_xlr2dict(d_column=1:int)) --> dict :gets used range to dict with d_column as keys
+		iter_rows(cell1=None:str, cell2=None:str) --> generator :yields rows one by one
+		read_sheets(sheets=None:list, processes=None:int) --> dict :used ranges of many sheets, in parallel
+
+	Sheets are parsed incrementally, shared strings are loaded only when first needed.
+	Values are returned like Value2 of COM: numbers as float (int if whole),
+	empty cells as None, errors as int codes.
+	"""
+	__version__ = '1.1.0'
+
+	#======================================================================
+	@property
+	def filename(self):
+		return self._filename
+
+	@property
+	def sheet_names(self):
+		"""Names of worksheets in workbook order"""
+		return [name for name, _ in self._sheets]
+	#======================================================================
+	def __init__(self, filename):
+		self._filename = filename
+		self._shared = None
+		try:
+			self._zip = zipfile.ZipFile(filename)
+			self._sheets = self._read_workbook()
+		except:
+			print('XlsxFileReader| Incorrect path!')
+			raise
+		self.activesheet = 1
+
+	#======================================================================
+	def activesheet_set(self, num=1):
+		"""Change active sheet number
+		"""
+		try:
+			if not isinstance(num, int): num = self.sheet_names.index(num) + 1
+			if not 1 <= num <= len(self._sheets): raise IndexError
+			self.activesheet = num
+		except:
+			print('XlsxFileReader| Invalid sheet number!')
+			self.activesheet = 1
+
+	#======================================================================
+	def g_xlr2list(self, cell1, cell2):
+		"""Gets excel range into a list
+		"""
+		return list(self.iter_rows(cell1, cell2))
+
+	#======================================================================
+	def g_xlr2dict(self, cell1, cell2, d_column=1):
+		"""Gets excel range into a dictionary
+		"""
+		return self.list2dict(self.g_xlr2list(cell1, cell2), d_column-1)
+
+	#======================================================================
+	def g_active_xlr2list(self):
+		"""Gets used range in an active sheet into a list
+		"""
+		return list(self.iter_rows())
+
+	#======================================================================
+	def g_active_xlr2dict(self, d_column=1):
+		"""Gets used range in an active sheet into a dictionary
+		"""
+		return self.list2dict(self.g_active_xlr2list(), d_column-1)
+
+	#======================================================================
+	def iter_rows(self, cell1=None, cell2=None):
+		"""Yields rows of a range (used range if cells are not defined)
+		"""
+		if cell1 is None:
+			bounds = self._used_range()
+			if bounds is None: return
+		else:
+			r1, c1 = self.cell2idx(cell1)
+			r2, c2 = self.cell2idx(cell2 if cell2 is not None else cell1)
+			bounds = (min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2))
+
+		top, left, bottom, right = bounds
+		width = right - left + 1
+		next_row = top
+		for r, cells in self._iter_sheet(self.activesheet, stop_row=bottom):
+			if r < top: continue
+			while next_row < r:
+				yield [None] * width
+				next_row += 1
+			row = [None] * width
+			for c, value in cells:
+				if left <= c <= right: row[c - left] = value
+			yield row
+			next_row = r + 1
+		while next_row <= bottom:
+			yield [None] * width
+			next_row += 1
+
+	#======================================================================
+	def read_sheets(self, sheets=None, processes=None):
+		"""Reads used ranges of several sheets with a process pool
+		
+		Shared strings are parsed once here and handed to every worker when it starts.
+		Falls back to reading one sheet after another if multiprocessing is not
+		available (IronPython) or only one process is requested.
+		Note: on Windows call it under 'if __name__ == "__main__":'
+		
+		Args:
+			sheets: list; sheet numbers or names, defaults to all sheets
+			processes: int; number of worker processes, defaults to number of CPUs
+		Returns:
+			dict; sheet name --> list of rows
+		"""
+		if sheets is None: sheets = list(range(1, len(self._sheets) + 1))
+		nums = []
+		for sheet in sheets:
+			num = sheet if isinstance(sheet, int) else self.sheet_names.index(sheet) + 1
+			if not 1 <= num <= len(self._sheets): raise IndexError('Invalid sheet number: {}'.format(sheet))
+			nums.append(num)
+		
+		shared = self._shared_strings()
+		if processes is None and multiprocessing is not None: 
+			processes = multiprocessing.cpu_count()
+		processes = min(processes or 1, len(nums))
+		
+		if multiprocessing is None or processes <= 1:
+			_init_worker(self._filename, shared)
+			try: results = [_read_sheet_worker(num) for num in nums]
+			finally: _init_worker(None, None)
+		else:
+			pool = multiprocessing.Pool(processes, initializer=_init_worker, initargs=(self._filename, shared))
+			try:
+				results = pool.map(_read_sheet_worker, nums, chunksize=1)
+			finally:
+				pool.close()
+				pool.join()
+		return dict(results)
+
+	#======================================================================
+	def close(self):
+		"""Close workbook file"""
+		if self._zip is not None:
+			self._zip.close()
+			self._zip = None
+
+	#======================================================================
+	@staticmethod
+	def list2dict(lrange, key_column=0):
+		"""Converts list to a dictionary with some column as keys
+		"""
+		key_column = int(key_column)
+		if key_column >= 0 or key_column < len(lrange[0]):
+			rdict = {}
+			for row in lrange:
+				cutrow = []
+				for i, elem in enumerate(row):
+					if not(i == key_column):
+						cutrow.append(elem)
+				if row[key_column] in rdict:
+					print('XlsxFileReader| Duplicate key found!')
+				else:
+					rdict[row[key_column]] = cutrow
+			return rdict
+		else:
+			print('XlsxFileReader| Invalid key number!')
+			return 0
+
+	#======================================================================
+	@staticmethod
+	def cell2idx(cell):
+		"""Converts 'B3' to (3, 2)
+		"""
+		match = _CELL_RE.match(cell.strip())
+		if not match: raise ValueError('Invalid cell: {}'.format(cell))
+		col = 0
+		for ch in match.group(1).upper():
+			col = col * 26 + ord(ch) - 64
+		return int(match.group(2)), col
+
+	#======================================================================
+	def _read_workbook(self):
+		"""Returns list of (sheet name, sheet xml path)"""
+		rels = {}
+		root = ElementTree.fromstring(self._zip.read('xl/_rels/workbook.xml.rels'))
+		for rel in root:
+			target = rel.get('Target')
+			if target.startswith('/'): path = target.lstrip('/')
+			else: path = posixpath.normpath(posixpath.join('xl', target))
+			rels[rel.get('Id')] = path
+
+		sheets = []
+		root = ElementTree.fromstring(self._zip.read('xl/workbook.xml'))
+		for elem in root.iter():
+			if self._local(elem.tag) == 'sheet':
+				sheets.append((elem.get('name'), rels[elem.get(_REL_NS + 'id')]))
+		return sheets
+
+	#======================================================================
+	def _shared_strings(self):
+		"""Shared strings table, parsed on first use"""
+		if self._shared is None:
+			self._shared = self.read_shared_strings(self._zip)
+		return self._shared
+
+	#======================================================================
+	def _used_range(self):
+		"""(top, left, bottom, right) of used range, None for an empty sheet"""
+		path = self._sheets[self.activesheet - 1][1]
+		with self._zip.open(path) as f:
+			for event, elem in ElementTree.iterparse(f, events=('start',)):
+				tag = self._local(elem.tag)
+				if tag == 'dimension':
+					ref = elem.get('ref', '').split(':')
+					r1, c1 = self.cell2idx(ref[0])
+					r2, c2 = self.cell2idx(ref[-1])
+					if (r1, c1, r2, c2) != (1, 1, 1, 1): return (r1, c1, r2, c2)
+					break
+				if tag == 'sheetData': break
+
+		# No dimension record, one pass to find it
+		bounds = None
+		for r, cells in self._iter_sheet(self.activesheet):
+			for c, value in cells:
+				if value is None: continue
+				if bounds is None: bounds = [r, c, r, c]
+				bounds = [min(bounds[0], r), min(bounds[1], c), max(bounds[2], r), max(bounds[3], c)]
+		return tuple(bounds) if bounds else None
+
+	#======================================================================
+	def _iter_sheet(self, num, stop_row=None):
+		"""Yields (row number, [(column number, value), ...]) of a sheet"""
+		path = self._sheets[num - 1][1]
+		shared = self._shared_strings
+		with self._zip.open(path) as f:
+			for r, cells in self.parse_sheet(f, shared, stop_row):
+				yield r, cells
+
+	#======================================================================
+	@classmethod
+	def parse_sheet(cls, fileobj, shared, stop_row=None):
+		"""
+		Incremental parser of a worksheet xml
+
+		Args:
+			fileobj: file-like object with sheet xml
+			shared: list of shared strings or a function returning it
+			stop_row: int; stop after this row
+		"""
+		row_num = 0
+		sheet_data = None
+		row_tag = c_tag = v_tag = None
+		columns = {}
+		for event, elem in ElementTree.iterparse(fileobj, events=('start', 'end')):
+			if event == 'start':
+				if row_tag is None:
+					# Tags are compared with namespace of the root element
+					ns = elem.tag[:elem.tag.find('}') + 1]
+					row_tag, c_tag, v_tag = ns + 'row', ns + 'c', ns + 'v'
+					sd_tag = ns + 'sheetData'
+				elif sheet_data is None and elem.tag == sd_tag: 
+					sheet_data = elem
+				continue
+			if elem.tag != row_tag: continue
+
+			row_num = int(elem.get('r', row_num + 1))
+			if stop_row is not None and row_num > stop_row: break
+
+			cells = []
+			col_num = 0
+			for cell in elem:
+				if cell.tag != c_tag: continue
+				ref = cell.get('r')
+				if ref:
+					letters = ref.rstrip('0123456789')
+					col_num = columns.get(letters)
+					if col_num is None: 
+						col_num = columns[letters] = cls.cell2idx(ref)[1]
+				else:
+					col_num += 1
+				
+				# Plain numbers are the most common, everything else goes to _cell_value
+				ctype = cell.get('t')
+				if ctype is None and len(cell) and cell[-1].tag == v_tag:
+					try:
+						value = float(cell[-1].text)
+						cells.append((col_num, int(value) if value.is_integer() else value))
+						continue
+					except (TypeError, ValueError):
+						pass
+				cells.append((col_num, cls._cell_value(cell, shared)))
+			yield row_num, cells
+			# Parsed rows are not needed anymore
+			elem.clear()
+			if sheet_data is not None: sheet_data.clear()
+
+	#======================================================================
+	@classmethod
+	def _cell_value(cls, cell, shared):
+		"""Converts <c> element to a Value2-like value"""
+		ctype = cell.get('t', 'n')
+		raw = None
+		for child in cell:
+			tag = cls._local(child.tag)
+			if tag == 'v': raw = child.text
+			elif tag == 'is': raw = cls._text(child)
+		if raw is None: return None
+
+		if ctype == 's':
+			table = shared() if callable(shared) else shared
+			return table[int(raw)]
+		if ctype in ('str', 'inlineStr'): return raw
+		if ctype == 'b': return raw == '1'
+		if ctype == 'e': return _ERRORS.get(raw, raw)
+		try:
+			value = float(raw)
+		except ValueError:
+			return raw
+		return int(value) if value.is_integer() else value
+
+	#======================================================================
+	@classmethod
+	def read_shared_strings(cls, zfile):
+		"""Reads shared strings table from an opened zip file"""
+		shared = []
+		try: f = zfile.open('xl/sharedStrings.xml')
+		except KeyError: return shared
+		with f:
+			for event, elem in ElementTree.iterparse(f):
+				if cls._local(elem.tag) == 'si':
+					shared.append(cls._text(elem))
+					elem.clear()
+		return shared
+
+	#======================================================================
+	@classmethod
+	def _text(cls, elem):
+		"""Text of all <t> elements inside (rich text runs), phonetic runs skipped"""
+		parts = []
+		for child in elem:
+			tag = cls._local(child.tag)
+			if tag == 't': parts.append(child.text or '')
+			elif tag == 'r': parts.append(cls._text(child))
+		return ''.join(parts)
+
+	@staticmethod
+	def _local(tag):
+		"""Tag name without namespace"""
+		return tag.rsplit('}', 1)[-1]
+
+	#======================================================================
+	def __del__(self):
+		try: self.close()
+		except: pass
+	#======================================================================
+	def __repr__(self):
+		return 'XlsxFileReader on file: {}'.format(self.filename)
+	#======================================================================
+	def __str__(self):
+		return self.filename
+	#======================================================================
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+	#======================================================================
+	def __enter__(self):
+		return self
+	#======================================================================
+	def __len__(self):
+		return len(self._sheets)
+
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_DOC_REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_XML_HEAD = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_SHEET_BAD_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+try: _TEXT = unicode
+except NameError: _TEXT = str
+try: _NUMBERS = (int, long, float)
+except NameError: _NUMBERS = (int, float)
+
+class XlsxFileWriter(object):
+	"""Streaming .xlsx writer, rows go to the file as they are written
+	Methods:
+
+		add_sheet(name=None:str, header=None:list) :starts a new sheet
+		write_row(row:list) :writes a row to the current sheet
+		write_rows(rows:iterable) :writes rows one by one
+		close() :finishes the workbook
+
+	Memory use does not depend on the number of rows: sheet xml is streamed into the
+	zip entry (through a temporary file where zipfile can't stream, e.g. IronPython).
+	Numbers (and strings that read as numbers) are written as numeric cells, 
+	None as an empty cell, everything else as text.
+	A sheet which reaches rows_per_sheet rows is continued in a new sheet 'name (2)' etc.
+	With append=True sheets of an existing file are kept and new ones are added after them;
+	kept sheets are copied unchanged with styles, shared strings and the parts they refer to
+	(drawings, comments, etc.), workbook level items (defined names, pivot caches, external
+	links, document properties) are dropped.
+
+	Args:
+		filename: str; .xlsx file to write
+		rows_per_sheet: int; data rows per sheet, Excel allows up to 1048576 rows with header
+		append: bool; keep sheets of an existing file
+		numeric_strings: bool; write strings like '1.5' as numbers
+	"""
+	__version__ = '1.0.0'
+
+	_flush_rows = 1000
+	_columns = []
+	#======================================================================
+	@property
+	def filename(self):
+		return self._filename
+
+	@property
+	def sheet_names(self):
+		return [name for name, _ in self._sheets]
+
+	@property
+	def rows_written(self):
+		"""Data rows written to all new sheets"""
+		return self._total
+	#======================================================================
+	def __init__(self, filename, rows_per_sheet=1000000, append=False, numeric_strings=True):
+		self._filename = filename
+		self._rows_per_sheet = max(1, int(rows_per_sheet))
+		self._numeric_strings = numeric_strings
+		self._sheets = []					#: (sheet name, sheet xml path)
+		self._entry = None					#: (xml path, stream, temporary file)
+		self._name = None					#: name of current sheet without chunk suffix
+		self._header = None
+		self._part = 0
+		self._rows = 0
+		self._row_num = 0
+		self._total = 0
+		self._buffer = []
+		self._parts = {}					#: workbook part kind -> path of a copied part
+		self._types = ({}, {})				#: content types of copied parts: (extensions, part names)
+
+		self._tmp_filename = filename + '.tmp'
+		self._zip = zipfile.ZipFile(self._tmp_filename, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+		try:
+			if append and os.path.isfile(filename): self._copy_sheets(filename)
+		except:
+			print('XlsxFileWriter| Failed to read sheets from: {}'.format(filename))
+			self._abort()
+			raise
+
+	#======================================================================
+	def add_sheet(self, name=None, header=None):
+		"""Starts a new sheet
+
+		Args:
+			name: str; sheet name, defaults to 'Sheet<number>'
+			header: list; first row, repeated on every chunk of the sheet
+		"""
+		self._finish_sheet()
+		if name is None: name = 'Sheet{}'.format(len(self._sheets) + 1)
+		self._name = _SHEET_BAD_CHARS.sub('_', name)[:31]
+		self._header = list(header) if header is not None else None
+		self._part = 0
+		self._start_sheet()
+
+	#======================================================================
+	def write_row(self, row):
+		"""Writes a row to the current sheet"""
+		if self._entry is None: self.add_sheet()
+		elif self._rows >= self._rows_per_sheet:
+			self._finish_sheet()
+			self._start_sheet()
+		self._rows += 1
+		self._total += 1
+		self._put_row(row)
+
+	#======================================================================
+	def write_rows(self, rows):
+		"""Writes rows from any iterable"""
+		for row in rows: self.write_row(row)
+
+	#======================================================================
+	def close(self):
+		"""Writes workbook parts and moves the file in place"""
+		if self._zip is None: return
+		try:
+			if not self._sheets and self._entry is None: self.add_sheet()
+			self._finish_sheet()
+			self._write_workbook()
+			self._zip.close()
+		except:
+			self._abort()
+			raise
+		self._zip = None
+		if os.path.isfile(self._filename): os.remove(self._filename)
+		os.rename(self._tmp_filename, self._filename)
+
+	#======================================================================
+	def _start_sheet(self):
+		"""Opens xml of the next sheet (or next chunk of the current one)"""
+		self._part += 1
+		name = self._name if self._part == 1 else '{} ({})'.format(self._name[:25], self._part)
+		name = self._unique_name(name)
+		# Copied sheets keep their paths, the number may be taken
+		used, num = set(path for _, path in self._sheets), len(self._sheets) + 1
+		while 'xl/worksheets/sheet{}.xml'.format(num) in used: num += 1
+		path = 'xl/worksheets/sheet{}.xml'.format(num)
+		self._sheets.append((name, path))
+		self._entry = self._open_entry(path)
+		self._rows = 0
+		self._row_num = 0
+		self._write(_XML_HEAD + '<worksheet xmlns="{}" xmlns:r="{}"><sheetData>'.format(_MAIN_NS, _DOC_REL_NS))
+		if self._header is not None: self._put_row(self._header)
+
+	def _finish_sheet(self):
+		if self._entry is None: return
+		self._flush()
+		self._write('</sheetData></worksheet>')
+		self._close_entry(self._entry)
+		self._entry = None
+
+	def _put_row(self, row):
+		"""Converts row to xml and buffers it"""
+		self._row_num += 1
+		r = str(self._row_num)
+		cells = []
+		for j, value in enumerate(row):
+			if value is None: continue
+			cells.append(self._cell_xml(self._column(j) + r, value))
+		self._buffer.append(u'<row r="{}">{}</row>'.format(r, u''.join(cells)))
+		if len(self._buffer) >= self._flush_rows: self._flush()
+
+	def _cell_xml(self, ref, value):
+		"""<c> element for a value"""
+		if isinstance(value, bool):
+			return '<c r="{}" t="b"><v>{}</v></c>'.format(ref, int(value))
+		if isinstance(value, _NUMBERS):
+			if math.isinf(value) or math.isnan(value): value = repr(value)
+			else: return '<c r="{}"><v>{}</v></c>'.format(ref, repr(value) if isinstance(value, float) else int(value))
+		if not isinstance(value, _TEXT):
+			value = str(value)
+			if not isinstance(value, _TEXT): value = value.decode('utf-8', 'replace')
+		if self._numeric_strings:
+			try: number = float(value)
+			except ValueError: pass
+			else:
+				if not (math.isinf(number) or math.isnan(number)):
+					return '<c r="{}"><v>{}</v></c>'.format(ref, repr(number))
+		space = ' xml:space="preserve"' if value != value.strip() else ''
+		return u'<c r="{}" t="inlineStr"><is><t{}>{}</t></is></c>'.format(ref, space, xml_escape(value))
+
+	def _flush(self):
+		if self._buffer:
+			self._write(u''.join(self._buffer))
+			self._buffer = []
+
+	def _write(self, text):
+		if isinstance(text, _TEXT): text = text.encode('utf-8')
+		self._entry[1].write(text)
+
+	#======================================================================
+	def _open_entry(self, path):
+		"""Stream for a new zip entry: zip itself or a temporary file"""
+		try: 
+			return (path, self._zip.open(path, 'w', force_zip64=True), None)
+		except (TypeError, RuntimeError, ValueError):
+			fd, tmp = tempfile.mkstemp(suffix='.xml', dir=os.path.dirname(os.path.abspath(self._filename)))
+			return (path, os.fdopen(fd, 'wb'), tmp)
+
+	def _close_entry(self, entry):
+		path, stream, tmp = entry
+		stream.close()
+		if tmp is not None:
+			try: self._zip.write(tmp, path)
+			finally: os.remove(tmp)
+
+	def _copy_sheets(self, filename):
+		"""Copies sheets of an existing workbook and all parts they use"""
+		with XlsxFileReader(filename) as reader:
+			src = reader._zip
+			names = set(src.namelist())
+			queue = [path for _, path in reader._sheets]
+			for _, rel_type, path in _read_rels(src, 'xl/workbook.xml'):
+				kind = rel_type.rsplit('/', 1)[-1]
+				if path and kind in ('styles', 'sharedStrings', 'theme'): 
+					self._parts[kind] = path
+					queue.append(path)
+			copied = set()
+			while queue:
+				path = queue.pop()
+				if path in copied or path not in names: continue
+				copied.add(path)
+				self._copy_entry(src, path)
+				rels = _rels_path(path)
+				if rels in names:
+					self._copy_entry(src, rels)
+					queue.extend(target for _, _, target in _read_rels(src, path) if target)
+			self._sheets.extend(reader._sheets)
+			
+			root = ElementTree.fromstring(src.read('[Content_Types].xml'))
+			for elem in root:
+				tag = XlsxFileReader._local(elem.tag)
+				if tag == 'Default': self._types[0][elem.get('Extension').lower()] = elem.get('ContentType')
+				elif tag == 'Override' and elem.get('PartName').lstrip('/') in copied: 
+					self._types[1][elem.get('PartName')] = elem.get('ContentType')
+
+	def _copy_entry(self, src, path):
+		entry = self._open_entry(path)
+		try:
+			with src.open(path) as f: shutil.copyfileobj(f, entry[1])
+		finally:
+			self._close_entry(entry)
+
+	def _write_workbook(self):
+		"""Workbook, relationships and content types"""
+		defaults = dict(self._types[0])
+		defaults.update(rels='application/vnd.openxmlformats-package.relationships+xml', xml='application/xml')
+		overrides = dict(self._types[1])
+		overrides['/xl/workbook.xml'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml'
+		
+		parts = dict(self._parts)
+		if 'styles' not in parts: 
+			parts['styles'] = 'xl/styles.xml'
+			overrides['/xl/styles.xml'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml'
+			
+		sheets, rels = [], []
+		for i, (name, path) in enumerate(self._sheets, 1):
+			sheets.append(u'<sheet name="{}" sheetId="{}" r:id="rId{}"/>'.format(xml_escape(name, {'"': '&quot;'}), i, i))
+			rels.append('<Relationship Id="rId{}" Type="{}/worksheet" Target="/{}"/>'.format(i, _DOC_REL_NS, path))
+			overrides.setdefault('/' + path, 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml')
+		for i, kind in enumerate(sorted(parts), len(self._sheets) + 1):
+			rels.append('<Relationship Id="rId{}" Type="{}/{}" Target="/{}"/>'.format(i, _DOC_REL_NS, kind, parts[kind]))
+		
+		types = ['<Default Extension="{}" ContentType="{}"/>'.format(*item) for item in sorted(defaults.items())]
+		types += ['<Override PartName="{}" ContentType="{}"/>'.format(*item) for item in sorted(overrides.items())]
+		self._zip.writestr('[Content_Types].xml', _XML_HEAD + 
+			'<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+			'{}</Types>'.format(''.join(types)))
+		self._zip.writestr('_rels/.rels', _XML_HEAD + 
+			'<Relationships xmlns="{}"><Relationship Id="rId1" Type="{}/officeDocument" Target="xl/workbook.xml"/>'
+			'</Relationships>'.format(_PKG_REL_NS, _DOC_REL_NS))
+		self._zip.writestr('xl/workbook.xml', (_XML_HEAD + 
+			u'<workbook xmlns="{}" xmlns:r="{}"><sheets>{}</sheets></workbook>'.format(_MAIN_NS, _DOC_REL_NS, u''.join(sheets))).encode('utf-8'))
+		self._zip.writestr('xl/_rels/workbook.xml.rels', _XML_HEAD + 
+			'<Relationships xmlns="{}">{}</Relationships>'.format(_PKG_REL_NS, ''.join(rels)))
+		if 'styles' in self._parts: return
+		self._zip.writestr('xl/styles.xml', _XML_HEAD + 
+			'<styleSheet xmlns="{}"><fonts count="1"><font/></fonts><fills count="1"><fill/></fills>'
+			'<borders count="1"><border/></borders><cellStyleXfs count="1"><xf/></cellStyleXfs>'
+			'<cellXfs count="1"><xf/></cellXfs></styleSheet>'.format(_MAIN_NS))
+
+	def _abort(self):
+		"""Drops unfinished file"""
+		try:
+			if self._entry is not None: self._close_entry(self._entry)
+		except: pass
+		self._entry = None
+		try: self._zip.close()
+		except: pass
+		self._zip = None
+		try: os.remove(self._tmp_filename)
+		except OSError: pass
+
+	def _unique_name(self, name):
+		"""Sheet names are case insensitive and unique"""
+		used = set(n.lower() for n, _ in self._sheets)
+		base, i = name, 1
+		while name.lower() in used:
+			i += 1
+			name = '{}_{}'.format(base[:28], i)
+		return name
+
+	@classmethod
+	def _column(cls, idx):
+		"""Column letters for zero-based index, cached"""
+		columns = cls._columns
+		while len(columns) <= idx:
+			num, letters = len(columns) + 1, ''
+			while num:
+				num, rem = divmod(num - 1, 26)
+				letters = chr(65 + rem) + letters
+			columns.append(letters)
+		return columns[idx]
+
+	#======================================================================
+	def __del__(self):
+		try: 
+			if self._zip is not None: self._abort()
+		except: pass
+	#======================================================================
+	def __repr__(self):
+		return 'XlsxFileWriter on file: {}'.format(self.filename)
+	#======================================================================
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None: self.close()
+		else: self._abort()
+	#======================================================================
+	def __enter__(self):
+		return self
+
+#==========================================================================
+def _rels_path(path):
+	"""xl/worksheets/sheet1.xml -> xl/worksheets/_rels/sheet1.xml.rels"""
+	root, name = posixpath.split(path)
+	return posixpath.join(root, '_rels', name + '.rels')
+
+def _read_rels(zfile, path):
+	"""Relationships of a package part: list of (id, type, target path); path is None for external targets"""
+	try: data = zfile.read(_rels_path(path))
+	except KeyError: return []
+	res = []
+	for rel in ElementTree.fromstring(data):
+		target = rel.get('Target')
+		if rel.get('TargetMode') == 'External': target = None
+		elif target.startswith('/'): target = target.lstrip('/')
+		else: target = posixpath.normpath(posixpath.join(posixpath.dirname(path), target))
+		res.append((rel.get('Id'), rel.get('Type'), target))
+	return res
+
+#==========================================================================
+# Process pool workers for XlsxFileReader.read_sheets()
+_worker_reader = None
+
+def _init_worker(filename, shared):
+	"""Opens workbook once per worker, shared strings come from the parent"""
+	global _worker_reader
+	if _worker_reader is not None: _worker_reader.close()
+	_worker_reader = None
+	if filename is None: return
+	_worker_reader = XlsxFileReader(filename)
+	_worker_reader._shared = shared
+
+def _read_sheet_worker(num):
+	"""Returns (sheet name, used range) of a sheet"""
+	_worker_reader.activesheet_set(num)
+	return _worker_reader.sheet_names[num - 1], _worker_reader.g_active_xlr2list()
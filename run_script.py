@@ -24,15 +24,18 @@ def find_module(st_in):
     return tuple(res) if len(stlist) > 1 else res[0]
     
 
-modules = ['WBInterface', 'ExcelFileReader', 'Logger', 'CSVTable']
+modules = ['WBInterface', 'ExcelFileReader', 'Logger', 'CSVTable', 'XlsxFile', 'RenderFarm', 'ImageStore']
 modules_files = find_module(modules)
 
-print('Using: {}, {}, {}, {}'.format(*modules))
+print('Using: {}, {}, {}, {}, {}, {}, {}'.format(*modules))
 
 if modules_files[0]: exec('from {} import WBInterface'.format(modules_files[0]))
-if modules_files[1]: exec('from {} import ExcelFileReader'.format(modules_files[1]))
+if modules_files[1]: exec('from {} import ExcelFileReader, ExcelAppPool'.format(modules_files[1]))
 if modules_files[2]: exec('from {} import Logger'.format(modules_files[2]))
 if modules_files[3]: exec('import {} as CSVTable'.format(modules_files[3]))
+if modules_files[4]: exec('from {} import XlsxFileReader'.format(modules_files[4]))
+if modules_files[5]: exec('from {} import RenderFarm'.format(modules_files[5]))
+if modules_files[6]: exec('import {} as ImageStore'.format(modules_files[6]))
 #===========================================================================
 #===========================================================================
 #===========================================================================
@@ -47,9 +50,15 @@ if __name__ == '__main__':
     #__________________________________________________________
     
     wb = WBInterface()
+    # Parallel runs can share one log file
+    # wb = WBInterface(logger=Logger('log.txt', shared=True, job=os.path.basename(filedir)))
+    # Write per-DP status table after update_project()
+    # wb = WBInterface(status_file='status.csv')
 
     try:
         wb.open_any(archive_first=True)
+        # Reuse unpacked project while archive doesn't change
+        # wb.open_archive(cache='_ArchiveCache')
         wb.find_and_import_parameters()
         #----------------------------------------------------------------
         # Parameters can be imported directly
@@ -68,8 +77,18 @@ if __name__ == '__main__':
         
         # Sets unit system
         # wb.set_unit_system('SYS', unit_sys='NMM')
+        
+        # Same settings in one Mechanical session instead of three
+        # with wb.js_transaction():
+            # wb.set_cores_number('SYS')
+            # wb.set_distributed('SYS', True)
+            # wb.set_unit_system('SYS', unit_sys='NMM')
         #============================================================================== 
         
+        # Record disk usage to disk_usage.csv, stop between DPs if less than 20 GB is free
+        # wb.set_disk_guard(min_free=20000, action='stop')
+        # Update failed DPs up to 2 more times, with 8 and then 4 cores
+        # wb.set_retry(attempts=3, cores=[8, 4], container='SYS')
         wb.update_project()
         
         #============================================================================== 
@@ -94,28 +113,48 @@ if __name__ == '__main__':
         
         #----------------------------------------------------------------
         # Can also save for each Design Point
-        # for i, dp in enumerate(wb.DPs):
-            # wb.set_active_DP(dp)
-            
-            # mesh_file = 'mesh_DP{}.png'.format(i)
-            # mesh_args = dict(width=1920*2, height=1080*2, zoom_to_fit=True)
-            # wb.save_mesh_view('SYS', cwdp('pictures'), mesh_file, **mesh_args)
+        # Mechanical stays open for the whole loop, set_active_DP() refreshes results in it
+        # with wb.mechanical_session('SYS'):
+            # for i, dp in enumerate(wb.DPs):
+                # wb.set_active_DP(dp)
+                
+                # mesh_file = 'mesh_DP{}.png'.format(i)
+                # mesh_args = dict(width=1920*2, height=1080*2, zoom_to_fit=True)
+                # wb.save_mesh_view('SYS', cwdp('pictures'), mesh_file, **mesh_args)
 
-            # fig_pref = 'Result_DP{}'.format(i)
-            # fig_args = dict(fpref=fig_pref, width=1920*2, height=1080*2, zoom_to_fit=True, fontfact=1.35)
-            # wb.save_figures('SYS', cwdp('pictures'), **fig_args) 
+                # fig_pref = 'Result_DP{}'.format(i)
+                # fig_args = dict(fpref=fig_pref, width=1920*2, height=1080*2, zoom_to_fit=True, fontfact=1.35)
+                # wb.save_figures('SYS', cwdp('pictures'), **fig_args) 
+            
+                # env_pref = 'Setup_DP{}'.format(i)
+                # env_args = dict(fpref=env_pref, width=1920, height=1080, zoom_to_fit=True, fontfact=1.5)
+                # wb.save_setups_view('SYS', cwdp('pictures'), **env_args) 
+        
+        # Or split DPs between several Workbench processes, each with its own project copy
+        # (project has to be saved first); pictures are collected in pictures/DP<n>/
+        # wb.save_project()
+        # farm = RenderFarm(workers=4, pictures=cwdp('pictures'), logger=wb)
+        # fig_args = dict(container='SYS', fpref='Result', width=1920*2, height=1080*2, zoom_to_fit=True, fontfact=1.35)
+        # env_args = dict(container='SYS', fpref='Setup', width=1920, height=1080, zoom_to_fit=True, fontfact=1.5)
+        # farm.run([('save_figures', fig_args), ('save_setups_view', env_args)], dps=range(len(wb.DPs)))
         
-            # env_pref = 'Setup_DP{}'.format(i)
-            # env_args = dict(fpref=env_pref, width=1920, height=1080, zoom_to_fit=True, fontfact=1.5)
-            # wb.save_setups_view('SYS', cwdp('pictures'), **env_args) 
+        # Identical pictures are kept once (hard links), PNGs are recompressed
+        # wb.log('Pictures compacted: {}'.format(ImageStore.compact(cwdp('pictures'))))
         #============================================================================== 
         
         wb.output_parameters()
+        # wb.output_parameters('output.xlsx', fkey='a')  # same results as a new sheet in .xlsx (needs XlsxFile)
         wb.export_wb_report()
     except Exception as err_msg:
         wb.fatal_error(err_msg)
     finally:
+        # Keep results only for 3 DPs with the smallest p4 and for failed DPs
+        # wb.set_retention('p4', keep=3, mode='min')
         wb.archive_if_complete()
+        # Parallel archiving with ProjectArchive module, falls back to workbench.Archive
+        # wb.archive_if_complete(fast=True, threads=8)
+        # Only files changed since the last run go to <name>_result.deltaNNN.zip
+        # wb.archive_if_complete(delta=True)
         wb.issue_end()
     
 
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of ExcelFileReader.xlr2list() against a fake COM range, run from the repository root:
+    python -m unittest discover tests
+Outside of IronPython the .NET modules ExcelFileReader imports are replaced by empty ones
+"""
+from __future__ import print_function
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import clr
+except ImportError:
+    def _module(name, **attrs):
+        module = sys.modules.setdefault(name, types.ModuleType(name))
+        for key, value in attrs.items(): setattr(module, key, value)
+        return module
+
+    class _Marshal(object):
+        @staticmethod
+        def FinalReleaseComObject(obj): return 0
+
+    _module('clr', AddReferenceByName=lambda name: None)
+    _module('System', Type=None, Activator=None)
+    _module('System.Runtime.InteropServices', Marshal=_Marshal)
+    _module('System.Runtime', InteropServices=sys.modules['System.Runtime.InteropServices'])
+    sys.modules['System'].Runtime = sys.modules['System.Runtime']
+    _module('Microsoft.Office.Interop.Excel')
+    _module('Microsoft.Office.Interop', Excel=sys.modules['Microsoft.Office.Interop.Excel'])
+    _module('Microsoft.Office', Interop=sys.modules['Microsoft.Office.Interop'])
+    _module('Microsoft', Office=sys.modules['Microsoft.Office'])
+
+from ExcelFileReader import ExcelFileReader
+
+
+class FakeArray(object):
+    """2D .NET array returned by Value2, indices start from 1 like in Excel"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def GetLowerBound(self, dim):
+        return 1
+
+    def __getitem__(self, index):
+        return self.rows[index[0] - 1][index[1] - 1]
+
+
+class FakeIndexer(object):
+    """Indexed COM property: range.Offset[r, c], range.Resize[n, m]"""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __getitem__(self, index):
+        return self.func(*index)
+
+
+class FakeCount(object):
+    def __init__(self, count):
+        self.Count = count
+
+
+class FakeRange(object):
+    """
+    Range of a sheet (list of rows) from (top, left), 0-based, of n x m cells;
+    every Value2 call is counted in calls shared by ranges of one sheet
+    """
+
+    def __init__(self, sheet, top, left, n, m, calls):
+        self.sheet, self.top, self.left, self.n, self.m = sheet, top, left, n, m
+        self.calls = calls
+        self.Rows = FakeCount(n)
+        self.Columns = FakeCount(m)
+        self.Offset = FakeIndexer(lambda r, c: FakeRange(sheet, top + r, left + c, n, m, calls))
+        self.Resize = FakeIndexer(lambda r, c: FakeRange(sheet, top, left, r, c, calls))
+
+    @property
+    def Value2(self):
+        self.calls.append((self.top, self.n))
+        rows = [row[self.left:self.left + self.m] for row in self.sheet[self.top:self.top + self.n]]
+        return rows[0][0] if self.n * self.m == 1 else FakeArray(rows)
+
+    def __getitem__(self, index):
+        # range[i, j] is a one cell range, i and j start from 1
+        return FakeRange(self.sheet, self.top + index[0] - 1, self.left + index[1] - 1, 1, 1, self.calls)
+
+
+def per_cell_read(xlrange):
+    """xlr2list() before bulk reads: one Value2 call per cell"""
+    n, m = xlrange.Rows.Count, xlrange.Columns.Count
+    vals = [[0] * m for i in range(n)]
+    for i in range(n):
+        for j in range(m):
+            tmp = xlrange[i+1, j+1].Value2
+            try:
+                if int(tmp) == tmp: tmp = int(tmp)
+            except: pass
+            vals[i][j] = tmp
+    return vals
+
+
+def make_sheet(n, m):
+    """Sheet with floats, whole floats, strings and empty cells"""
+    values = [1.0, 2.5, 'text', None, -3.0, 1e20, '7', 0.0]
+    return [[values[(i * m + j) % len(values)] for j in range(m)] for i in range(n)]
+
+
+class TestXlr2List(unittest.TestCase):
+    """xlr2list() reads a range block by block with the same result as a per-cell read"""
+
+    def setUp(self):
+        self.block = ExcelFileReader._max_block_cells
+
+    def tearDown(self):
+        ExcelFileReader._max_block_cells = self.block
+
+    def read(self, n, m, block=None):
+        """(xlr2list() result, per-cell result, Value2 calls of xlr2list())"""
+        if block: ExcelFileReader._max_block_cells = block
+        sheet = make_sheet(n, m)
+        calls = []
+        vals = ExcelFileReader.xlr2list(FakeRange(sheet, 0, 0, n, m, calls))
+        return vals, per_cell_read(FakeRange(sheet, 0, 0, n, m, [])), calls
+
+    def test_one_block(self):
+        vals, expected, calls = self.read(10, 4)
+        self.assertEqual(vals, expected)
+        self.assertEqual(len(calls), 1)
+
+    def test_int_coercion(self):
+        vals, expected, calls = self.read(2, 4)
+        self.assertEqual(vals, [[1, 2.5, 'text', None], [-3, 10**20, '7', 0]])
+        self.assertEqual(vals, expected)
+        self.assertTrue(all(type(a) is type(b) for ra, rb in zip(vals, expected) for a, b in zip(ra, rb)))
+
+    def test_single_cell(self):
+        vals, expected, calls = self.read(1, 1)
+        self.assertEqual(vals, [[1]])
+        self.assertEqual(vals, expected)
+        self.assertEqual(len(calls), 1)
+
+    def test_blocks(self):
+        # 3 columns, 7 cells per block --> 2 rows per block, last block of 1 row
+        vals, expected, calls = self.read(7, 3, block=7)
+        self.assertEqual(vals, expected)
+        self.assertEqual(calls, [(0, 2), (2, 2), (4, 2), (6, 1)])
+
+    def test_blocks_exact(self):
+        vals, expected, calls = self.read(8, 3, block=6)
+        self.assertEqual(vals, expected)
+        self.assertEqual(calls, [(0, 2), (2, 2), (4, 2), (6, 2)])
+
+    def test_single_cell_blocks(self):
+        # One column: last block is a single cell and Value2 returns a value, not an array
+        vals, expected, calls = self.read(5, 1, block=2)
+        self.assertEqual(vals, expected)
+        self.assertEqual(calls, [(0, 2), (2, 2), (4, 1)])
+
+    def test_wide_rows(self):
+        # Row wider than a block is still read in one call
+        vals, expected, calls = self.read(3, 5, block=2)
+        self.assertEqual(vals, expected)
+        self.assertEqual(calls, [(0, 1), (1, 1), (2, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
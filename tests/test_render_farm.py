@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of RenderFarm with a stub instead of Workbench, run from the repository root:
+    python -m unittest discover tests
+"""
+from __future__ import print_function
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from RenderFarm import RenderFarm, JOB_FILE, DONE_FILE, WORKER_SCRIPT
+
+# Called as <python> <stub> -B -R <worker script> in a worker directory,
+# writes a dummy picture per (DP, export) like run_worker() does
+STUB = '''
+import os, sys, json
+script = sys.argv[sys.argv.index('-R') + 1]
+assert os.path.dirname(os.path.abspath(script)) == os.getcwd()
+with open('render_job.json') as f: job = json.load(f)
+results = []
+for dp, i in job['units']:
+    name, kwargs = job['exports'][i]
+    ok = not (dp == 3 and name == 'save_mesh_view')
+    if ok:
+        fpath = os.path.join(job['pictures'], 'DP{}'.format(dp))
+        if not os.path.isdir(fpath): os.makedirs(fpath)
+        with open(os.path.join(fpath, '{}_{}.png'.format(kwargs['fpref'], name)), 'w') as f:
+            f.write('{} {}'.format(dp, name))
+    results.append([dp, i, ok])
+with open('render_done.json', 'w') as f: json.dump(results, f)
+'''
+
+
+class TestRenderFarm(unittest.TestCase):
+    """Splitting (DP, export) pairs between workers and collecting their pictures"""
+
+    exports = [('save_figures', dict(container='SYS', fpref='Result')),
+               ('save_mesh_view', dict(container='SYS', fpref='Mesh'))]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.project = os.path.join(self.dir, 'prj.wbpj')
+        with open(self.project, 'w') as f: f.write('project')
+        os.makedirs(os.path.join(self.dir, 'prj_files', 'dp0'))
+        os.makedirs(os.path.join(self.dir, 'prj_files', '_ProjectScratch'))
+        self.stub = os.path.join(self.dir, 'stub.py')
+        with open(self.stub, 'w') as f: f.write(STUB)
+        self.poll = RenderFarm._poll
+        RenderFarm._poll = 0.05
+
+    def tearDown(self):
+        RenderFarm._poll = self.poll
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def farm(self, workers, pictures='pictures', keep=False):
+        return RenderFarm(self.project, workers=workers, executable=[sys.executable, self.stub],
+                          work_dir=os.path.join(self.dir, '_RenderFarm'),
+                          pictures=os.path.join(self.dir, pictures), logger=self, keep=keep)
+
+    def log(self, msg, newline=0, info=''):
+        pass
+
+    def tree(self, pictures):
+        root = os.path.join(self.dir, pictures)
+        res = {}
+        for path, _, files in os.walk(root):
+            for name in files:
+                with open(os.path.join(path, name)) as f:
+                    res[os.path.relpath(os.path.join(path, name), root).replace(os.sep, '/')] = f.read()
+        return res
+
+    def test_split(self):
+        shares = RenderFarm.split(list(range(10)), 4)
+        self.assertEqual(shares, [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]])
+        self.assertEqual(RenderFarm.split([1, 2], 5), [[1], [2]])
+
+    def test_run(self):
+        res = self.farm(3, keep=True).run(self.exports, dps=range(5))
+        self.assertEqual(res['returncodes'], [0, 0, 0])
+        self.assertEqual(res['rendered'], 9)
+        self.assertEqual(res['failed'], [[3, 'save_mesh_view']])
+
+        expected = {}
+        for dp in range(5):
+            expected['DP{}/Result_save_figures.png'.format(dp)] = '{} save_figures'.format(dp)
+            if dp != 3: expected['DP{}/Mesh_save_mesh_view.png'.format(dp)] = '{} save_mesh_view'.format(dp)
+        self.assertEqual(self.tree('pictures'), expected)
+
+        # 10 pairs over 3 workers: 4, 3, 3 contiguous pairs, project copied without scratch
+        units = []
+        for num, size in enumerate([4, 3, 3]):
+            wdir = os.path.join(self.dir, '_RenderFarm', 'worker{}'.format(num))
+            with open(os.path.join(wdir, JOB_FILE)) as f: job = json.load(f)
+            self.assertEqual(len(job['units']), size)
+            units += job['units']
+            for name in ['prj.wbpj', 'RenderFarm.py', 'WBInterface.py', WORKER_SCRIPT, DONE_FILE]:
+                self.assertTrue(os.path.isfile(os.path.join(wdir, name)), name)
+            self.assertTrue(os.path.isdir(os.path.join(wdir, 'prj_files', 'dp0')))
+            self.assertFalse(os.path.exists(os.path.join(wdir, 'prj_files', '_ProjectScratch')))
+        self.assertEqual(units, [[dp, i] for dp in range(5) for i in range(2)])
+
+    def test_names_independent_of_workers(self):
+        self.farm(1, pictures='one').run(self.exports, dps=range(5))
+        self.farm(4, pictures='four').run(self.exports, dps=range(5))
+        self.assertEqual(self.tree('one'), self.tree('four'))
+        self.assertEqual(len(self.tree('one')), 9)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, '_RenderFarm')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of WBInterface.copy_files() / move_files(), run from the repository root:
+    python -m unittest discover tests
+"""
+from __future__ import print_function
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from WBInterface import WBInterface
+
+
+class TestMoveToSameDirectory(unittest.TestCase):
+    """move_files() with the same source and target must keep the files"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.file = os.path.join(self.dir, 'a.txt')
+        with open(self.file, 'w') as f: f.write('data')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_skip_identical(self):
+        res = WBInterface.move_files('*.txt', self.dir, self.dir)
+        self.assertEqual(res['skipped'], 1)
+        with open(self.file) as f: self.assertEqual(f.read(), 'data')
+
+    def test_no_skip_identical(self):
+        res = WBInterface.move_files('*.txt', self.dir, self.dir, skip_identical=False)
+        self.assertEqual(res['skipped'], 1)
+        with open(self.file) as f: self.assertEqual(f.read(), 'data')
+
+    def test_hard_link_target(self):
+        target = os.path.join(self.dir, 'mv')
+        os.makedirs(target)
+        try: os.link(self.file, os.path.join(target, 'a.txt'))
+        except (OSError, AttributeError): self.skipTest('no hard links here')
+        WBInterface.move_files('*.txt', self.dir, target, skip_identical=False)
+        with open(os.path.join(target, 'a.txt')) as f: self.assertEqual(f.read(), 'data')
+
+
+if __name__ == '__main__':
+    unittest.main()